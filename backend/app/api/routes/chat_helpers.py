@@ -4,9 +4,14 @@ Extraídas de chat.py para melhor organização e manutenibilidade.
 """
 from loguru import logger
 
-from app.core.search_utils import get_adaptive_top_k, search_with_fallback
+from app.core.search_utils import (
+    get_adaptive_top_k,
+    search_with_fallback,
+    search_hybrid_with_fallback,
+    should_use_hybrid_search
+)
 from app.core.query_router import should_use_tool_first, should_use_rag_first
-from app.core.tools import MetricsTool
+from app.core.tools import get_metrics_tool
 from app.core.param_extractor import extract_tool_params
 from app.utils.pii_anonymizer import anonymize_pii
 from app.core.context_manager import ContextManager
@@ -201,7 +206,7 @@ async def fetch_context_and_tools(
     # Tool Execution Task
     if should_use_tool:
         if query_type in ["metrica_temporal", "status_temporal"] or "metric" in strategy_params.get("type", ""):
-            metrics_tool = MetricsTool()
+            metrics_tool = get_metrics_tool()
             tool_params = extract_tool_params(
                 query=request_message,
                 query_type=query_type,
@@ -211,7 +216,6 @@ async def fetch_context_and_tools(
             
     # RAG Search Task
     if should_use_rag:
-        from app.core.search_utils import should_use_hybrid_search, search_hybrid_with_fallback
         top_k = get_adaptive_top_k(query_type)
         
         if should_use_hybrid_search(search_query):
@@ -29,8 +29,10 @@ def is_langsmith_enabled() -> bool:
     api_key = settings.langsmith_api_key
     
     enabled = tracing_enabled and bool(api_key)
-    # Log temporário para debug
-    logger.info(f"LangSmith status check: enabled={enabled}, tracing={tracing_enabled}, key_present={bool(api_key)}")
+    logger.debug(
+        "LangSmith status check: enabled={}, tracing={}, key_present={}",
+        enabled, tracing_enabled, bool(api_key)
+    )
     
     return enabled
 
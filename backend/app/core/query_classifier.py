@@ -7,6 +7,31 @@ from loguru import logger
 import re
 
 
+# Comando direto ou anexo automático: nunca é pergunta de capacidade
+_COMMAND_OR_ATTACHMENT_RE = re.compile(
+    r"^(analise|leia|veja|processe|\[arquivo:)\s*(o\s+)?(arquivo|isso|imagem|foto|pdf)?"
+)
+
+# Perguntas sobre capacidades do assistente: uma única alternação compilada
+# (prefixos comuns como "você"/"vc" fatorados) em vez de um re.search por padrão
+_CAPABILITY_Q_RE = re.compile(
+    r"você\s+(?:é|está|pode|consegue|faz|realiza|analisa|extrai|lê|le|aceita|suporta|trabalha\s+com)"
+    r"|vc\s+(?:pode|consegue|faz|realiza|analisa|extrai|lê|le)"
+    r"|que\s+(?:você|vc)\s+(?:pode|consegue|faz)"
+    r"|que\s+tipo\s+(?:de\s+)?(?:arquivo|documento|formato)"
+    r"|quais\s+(?:tipos|formatos)\s+(?:de\s+)?(?:arquivo|documento)"
+    r"|quais\s+(?:são\s+)?(?:suas\s+)?(?:capacidades|funcionalidades|recursos)"
+    r"|capaz\s+de"
+)
+
+_FILE_RELATED_KEYWORDS = (
+    "arquivo", "documento", "pdf", "docx", "pptx", "excel", "xlsx",
+    "formato", "tipo", "extrair", "ler", "le", "analisar", "processar",
+    "imagem", "imagens", "jpeg", "jpg", "png", "gif", "bmp", "tiff", "webp",
+    "foto", "fotos", "fotografia", "ocr", "reconhecimento"
+)
+
+
 def classify_query(query: str, message_history: List = None) -> str:
     """
     Classifica o tipo de consulta com detecção de padrões mais inteligente.
@@ -24,34 +49,13 @@ def classify_query(query: str, message_history: List = None) -> str:
     # 0. Detectar perguntas sobre CAPACIDADES DO ASSISTENTE (prioridade máxima)
     # Essas perguntas devem ser respondidas diretamente, sem buscar no RAG
     # EXCEÇÃO: Se for um comando direto ou anexo automático, NÃO é capacidade.
-    if re.search(r"^(analise|leia|veja|processe|\[arquivo:)\s*(o\s+)?(arquivo|isso|imagem|foto|pdf)?", query_lower):
+    if _COMMAND_OR_ATTACHMENT_RE.search(query_lower):
         logger.debug(f"Query identificada como COMANDO OU ANEXO, ignorando categoria capacidade: '{query}'")
-    else:
-        capability_patterns = [
-            r"você\s+(é|está|pode|consegue|faz|realiza|analisa|extrai|lê|le)",
-            r"(você|vc)\s+(pode|consegue|faz|realiza|analisa|extrai|lê|le)",
-            r"que\s+tipo\s+(de\s+)?(arquivo|documento|formato)",
-            r"quais\s+(tipos|formatos)\s+(de\s+)?(arquivo|documento)",
-            r"você\s+(aceita|suporta|trabalha\s+com)",
-            r"(é|está)\s+capaz\s+(de|de\s+extrair|de\s+ler|de\s+analisar)",
-            r"capaz\s+(de|de\s+extrair|de\s+ler|de\s+analisar)",
-            r"que\s+(você|vc)\s+(pode|consegue|faz)",
-            r"o\s+que\s+(você|vc)\s+(pode|consegue|faz)",
-            r"quais\s+(são\s+)?(suas\s+)?(capacidades|funcionalidades|recursos)",
-        ]
-        
-        for pattern in capability_patterns:
-            if re.search(pattern, query_lower):
-                # Verificar se menciona arquivos/documentos/formats/imagens
-                file_related_keywords = [
-                    "arquivo", "documento", "pdf", "docx", "pptx", "excel", "xlsx",
-                    "formato", "tipo", "extrair", "ler", "le", "analisar", "processar",
-                    "imagem", "imagens", "jpeg", "jpg", "png", "gif", "bmp", "tiff", "webp",
-                    "foto", "fotos", "fotografia", "ocr", "reconhecimento"
-                ]
-                if any(keyword in query_lower for keyword in file_related_keywords):
-                    logger.debug(f"Query classificada como CAPACIDADE (sobre arquivos): '{query}'")
-                    return "capacidade"
+    elif _CAPABILITY_Q_RE.search(query_lower):
+        # Verificar se menciona arquivos/documentos/formats/imagens
+        if any(keyword in query_lower for keyword in _FILE_RELATED_KEYWORDS):
+            logger.debug(f"Query classificada como CAPACIDADE (sobre arquivos): '{query}'")
+            return "capacidade"
     
     # Verificar também no histórico se é follow-up sobre capacidades
     if message_history:
@@ -2,7 +2,9 @@
 Serviço RAG (Retrieval-Augmented Generation) usando PGVector.
 Busca semântica de documentos indexados no Supabase.
 """
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Awaitable, Callable
+from dataclasses import dataclass
+from operator import attrgetter
 from loguru import logger
 from app.services.supabase_service import get_supabase_client
 from app.services.embedding_service import generate_embedding
@@ -19,6 +21,32 @@ settings = get_settings()
 # Cache global para buscas RAG (200 itens, 1 minuto TTL)
 rag_search_cache = TTLCache(maxsize=200, ttl=60)
 
+
+@dataclass(slots=True)
+class RetrievedDoc:
+    """
+    Documento recuperado em memória (representação compacta com __slots__).
+    
+    Usado nos caminhos que pontuam muitos candidatos antes de cortar em top_k;
+    a API pública continua retornando dicts (serializáveis no cache Redis).
+    """
+    id: Any
+    content: str
+    metadata: Dict[str, Any]
+    similarity: float
+    created_at: Optional[str] = None
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Converte para o formato dict esperado pelos chamadores."""
+        return {
+            'id': self.id,
+            'content': self.content,
+            'metadata': self.metadata,
+            'similarity': self.similarity,
+            'created_at': self.created_at
+        }
+
+
 class RAGService:
     """Serviço RAG para busca semântica de documentos."""
     
@@ -32,7 +60,8 @@ class RAGService:
         query: str,
         top_k: int = 5,
         similarity_threshold: float = 0.35,
-        filters: Optional[Dict[str, Any]] = None
+        filters: Optional[Dict[str, Any]] = None,
+        embedding_provider: Optional[Callable[[], Awaitable[List[float]]]] = None
     ) -> List[Dict[str, Any]]:
         """
         Busca documentos similares usando busca vetorial nativa do PostgreSQL (pgvector).
@@ -45,6 +74,7 @@ class RAGService:
             top_k: Número de documentos a retornar
             similarity_threshold: Limite mínimo de similaridade (0-1)
             filters: Filtros opcionais por metadata (dict com chave-valor)
+            embedding_provider: Gera o embedding sob demanda, só em cache miss (evita regerar em buscas em cascata)
             
         Returns:
             List[Dict]: Lista de documentos encontrados com metadata
@@ -56,8 +86,11 @@ class RAGService:
                 logger.info(f"🎯 RAG Cache Hit para: {query[:50]}")
                 return cached_results
 
-            # Gerar embedding da query
-            query_embedding = await generate_embedding(query)
+            # Gerar embedding da query (cache miss)
+            if embedding_provider is not None:
+                query_embedding = await embedding_provider()
+            else:
+                query_embedding = await generate_embedding(query)
             
             # Preparar filtros de metadata para formato JSONB
             # Função SQL espera '{}' quando não há filtros, não None
@@ -190,17 +223,17 @@ class RAGService:
                 similarity = np.dot(query_vec, doc_vec) / (norm(query_vec) * norm(doc_vec))
                 
                 if similarity >= similarity_threshold:
-                    documents_with_similarity.append({
-                        'id': row['id'],
-                        'content': row['content'],
-                        'metadata': row.get('metadata', {}),
-                        'similarity': float(similarity),
-                        'created_at': row.get('created_at')
-                    })
-            
-            # Ordenar e retornar top_k
-            documents_with_similarity.sort(key=lambda x: x['similarity'], reverse=True)
-            documents = documents_with_similarity[:top_k]
+                    documents_with_similarity.append(RetrievedDoc(
+                        id=row['id'],
+                        content=row['content'],
+                        metadata=row.get('metadata', {}),
+                        similarity=float(similarity),
+                        created_at=row.get('created_at')
+                    ))
+            
+            # Ordenar e retornar top_k (apenas os selecionados viram dict)
+            documents_with_similarity.sort(key=attrgetter('similarity'), reverse=True)
+            documents = [doc.to_dict() for doc in documents_with_similarity[:top_k]]
             
             logger.info(f"Busca RAG (fallback) retornou {len(documents)} documentos")
             return documents
@@ -4,9 +4,15 @@ Utilitários para busca RAG com threshold adaptativo e fallback.
 from typing import Dict, Any, Optional, List
 from loguru import logger
 from app.core.rag_service import RAGService
+from app.services.embedding_service import generate_embedding
 from app.core.tracing import trace_rag_pipeline
 
 
+# Margem acima do threshold inicial a partir da qual um resultado híbrido
+# é considerado confiável mesmo com menos documentos que min_docs
+_HYBRID_HIGH_CONFIDENCE_MARGIN = 0.1
+
+
 def get_adaptive_threshold(query_type: str, corpus_size: int = 45) -> float:
     """
     Calcula threshold adaptativo baseado no tamanho do corpus.
@@ -76,63 +82,63 @@ def get_adaptive_top_k(query_type: str, initial_results: Optional[List] = None)
             # Se primeira similaridade é baixa, aumentar top_k
             top_k = min(top_k + 2, 10)  # Máximo 10 documentos
             logger.debug(
-                f"Ajuste dinâmico: similaridade inicial baixa ({first_similarity:.2f}), "
-                f"aumentando top_k de {base_top_k.get(query_type, 5)} para {top_k}"
+                "Ajuste dinâmico: similaridade inicial baixa ({:.2f}), aumentando top_k de {} para {}",
+                first_similarity, base_top_k.get(query_type, 5), top_k
             )
     
     return top_k
 
 
-async def search_with_fallback(
+def _build_threshold_schedule(initial_threshold: float) -> List[float]:
+    """Gera lista de thresholds a partir do inicial (reduz 0.05 a cada tentativa)."""
+    thresholds = [initial_threshold]
+    current = initial_threshold
+    while current > 0.20:
+        current -= 0.05
+        thresholds.append(round(current, 2))
+    return thresholds
+
+
+async def _run_threshold_cascade(
     query: str,
-    query_type: str,
+    thresholds: List[float],
     rag_service: RAGService,
-    top_k: int = 5,
-    min_docs: int = 2,
-    filters: Optional[Dict[str, Any]] = None
+    top_k: int,
+    min_docs: int,
+    filters: Optional[Dict[str, Any]]
 ) -> tuple[list[dict], float]:
     """
-    Busca com fallback automático de threshold.
-    
-    Estratégia:
-    1. Tenta threshold inicial (adaptativo)
-    2. Se retorna < min_docs, reduz threshold em 0.05
-    3. Repete até encontrar min_docs ou atingir threshold mínimo (0.20)
+    Executa a busca vetorial em cascata sobre uma lista de thresholds.
     
-    Args:
-        query: Query do usuário
-        query_type: Tipo da query
-        rag_service: Instância do RAGService
-        top_k: Número máximo de documentos
-        min_docs: Número mínimo de documentos desejados
-        filters: Filtros opcionais de metadata para busca
+    O embedding da query é gerado só no primeiro cache miss do RAG e reutilizado
+    nas tentativas seguintes.
     
     Returns:
         tuple: (lista de documentos, threshold utilizado)
     """
-    initial_threshold = get_adaptive_threshold(query_type)
-    thresholds = [initial_threshold]
+    logger.info("Iniciando busca com fallback. Thresholds: {} (filtros: {})", thresholds, filters)
     
-    # Gera lista de fallback thresholds (reduz 0.05 a cada tentativa)
-    current = initial_threshold
-    while current > 0.20:
-        current -= 0.05
-        thresholds.append(round(current, 2))
+    query_embedding: Optional[List[float]] = None
     
-    logger.info(f"Iniciando busca com fallback. Thresholds: {thresholds} (filtros: {filters})")
+    async def embed_query() -> List[float]:
+        nonlocal query_embedding
+        if query_embedding is None:
+            query_embedding = await generate_embedding(query)
+        return query_embedding
     
     for threshold in thresholds:
         results = await rag_service.search_similar(
             query=query,
             top_k=top_k,
             similarity_threshold=threshold,
-            filters=filters  # Passar filtros para busca
+            filters=filters,  # Passar filtros para busca
+            embedding_provider=embed_query
         )
         
-        logger.debug(f"Threshold {threshold:.2f}: {len(results)} documentos encontrados")
+        logger.debug("Threshold {:.2f}: {} documentos encontrados", threshold, len(results))
         
         if len(results) >= min_docs:
-            logger.info(f"✅ Fallback bem-sucedido com threshold {threshold:.2f}")
+            logger.info("✅ Fallback bem-sucedido com threshold {:.2f}", threshold)
             return results, threshold
     
     # Se nenhum threshold encontrou docs suficientes, retorna o melhor resultado
@@ -140,17 +146,49 @@ async def search_with_fallback(
         query=query,
         top_k=top_k,
         similarity_threshold=0.20,
-        filters=filters  # Passar filtros também no fallback final
+        filters=filters,  # Passar filtros também no fallback final
+        embedding_provider=embed_query
     )
     
     logger.warning(
-        f"⚠️ Fallback atingiu threshold mínimo (0.20). "
-        f"Retornando {len(final_results)} documentos."
+        "⚠️ Fallback atingiu threshold mínimo (0.20). Retornando {} documentos.",
+        len(final_results)
     )
     
     return final_results, 0.20
 
 
+async def search_with_fallback(
+    query: str,
+    query_type: str,
+    rag_service: RAGService,
+    top_k: int = 5,
+    min_docs: int = 2,
+    filters: Optional[Dict[str, Any]] = None
+) -> tuple[list[dict], float]:
+    """
+    Busca com fallback automático de threshold.
+    
+    Estratégia:
+    1. Tenta threshold inicial (adaptativo)
+    2. Se retorna < min_docs, reduz threshold em 0.05
+    3. Repete até encontrar min_docs ou atingir threshold mínimo (0.20)
+    
+    Args:
+        query: Query do usuário
+        query_type: Tipo da query
+        rag_service: Instância do RAGService
+        top_k: Número máximo de documentos
+        min_docs: Número mínimo de documentos desejados
+        filters: Filtros opcionais de metadata para busca
+    
+    Returns:
+        tuple: (lista de documentos, threshold utilizado)
+    """
+    thresholds = _build_threshold_schedule(get_adaptive_threshold(query_type))
+    return await _run_threshold_cascade(query, thresholds, rag_service, top_k, min_docs, filters)
+
+
 @trace_rag_pipeline(name="hybrid_search_with_fallback")
 async def search_hybrid_with_fallback(
     query: str,
@@ -178,7 +216,7 @@ async def search_hybrid_with_fallback(
     """
     initial_threshold = get_adaptive_threshold(query_type)
     
-    logger.info(f"Iniciando busca híbrida para query_type: {query_type}")
+    logger.info("Iniciando busca híbrida para query_type: {}", query_type)
     
     # Tentar busca híbrida primeiro
     try:
@@ -190,7 +228,12 @@ async def search_hybrid_with_fallback(
         )
         
         if len(results) >= min_docs:
-            logger.info(f"✅ Busca híbrida bem-sucedida: {len(results)} docs")
+            logger.info("✅ Busca híbrida bem-sucedida: {} docs", len(results))
+            return results, initial_threshold, "hybrid"
+        
+        # Resultado com alta similaridade já é suficiente: evita nova rodada de buscas
+        if results and results[0]['similarity'] >= initial_threshold + _HYBRID_HIGH_CONFIDENCE_MARGIN:
+            logger.info("✅ Busca híbrida com alta confiança: {} docs", len(results))
             return results, initial_threshold, "hybrid"
         
         # Se não encontrou docs suficientes, tentar com threshold menor
@@ -204,25 +247,25 @@ async def search_hybrid_with_fallback(
             )
             
             if len(results) >= min_docs:
-                logger.info(f"✅ Busca híbrida com threshold reduzido: {len(results)} docs")
+                logger.info("✅ Busca híbrida com threshold reduzido: {} docs", len(results))
                 return results, lower_threshold, "hybrid"
         
         # Se ainda não encontrou, retornar o que temos
         if results:
-            logger.info(f"⚠️ Busca híbrida retornou {len(results)} docs (menos que min_docs)")
+            logger.info("⚠️ Busca híbrida retornou {} docs (menos que min_docs)", len(results))
             return results, initial_threshold, "hybrid"
             
     except Exception as e:
-        logger.warning(f"Erro na busca híbrida, usando fallback vetorial: {e}")
-    
-    # Fallback para busca vetorial padrão
-    results, threshold = await search_with_fallback(
-        query=query,
-        query_type=query_type,
-        rag_service=rag_service,
-        top_k=top_k,
-        min_docs=min_docs,
-        filters=filters
+        logger.warning("Erro na busca híbrida, usando fallback vetorial: {}", e)
+    
+    # Fallback para busca vetorial padrão (reaproveita o threshold já calculado)
+    results, threshold = await _run_threshold_cascade(
+        query,
+        _build_threshold_schedule(initial_threshold),
+        rag_service,
+        top_k,
+        min_docs,
+        filters
     )
     
     return results, threshold, "vector"
@@ -2,81 +2,161 @@
 Detector de interações sociais que não precisam de RAG.
 Detecta cumprimentos, perguntas sobre o assistente, agradecimentos, etc.
 """
-from typing import Optional
+import re
+from functools import lru_cache
+from typing import Dict, Optional, Pattern, Set, Tuple
 from loguru import logger
 
 
+# Palavras/expressões por categoria de interação social
+_SOCIAL_CATEGORIES: Dict[str, Tuple[str, ...]] = {
+    "greetings": (
+        "oi", "olá", "e aí", "hey", "hello",
+        "bom dia", "boa tarde", "boa noite"
+    ),
+    "about_assistant": (
+        "qual seu nome", "quem é você", "o que você faz", "você é",
+        "como você se chama", "o que você pode fazer", "quais suas funções"
+    ),
+    "thanks": ("obrigado", "obrigada", "valeu", "agradeço"),
+    "farewells": ("tchau", "até logo", "até mais", "até breve", "falou", "flw", "bye"),
+    "how_are_you": ("como vai", "tudo bem", "tudo bom", "como está", "beleza", "tranquilo"),
+    "operational_context": ("operação", "unidade", "métrica", "alerta", "procedimento"),
+}
+
+
+# Respostas diretas por categoria
+_RESP_GREETING = "Olá! Sou o Assistente Operacional da Treq. Como posso ajudar você hoje?"
+_RESP_ABOUT = (
+    "Sou o Assistente Operacional da Treq. "
+    "Posso ajudar com alertas operacionais, procedimentos, métricas e análise de causas. "
+    "Também consigo analisar documentos (PDF, DOCX, PPTX, Excel) para extrair informações operacionais."
+)
+_RESP_THANKS = "De nada! Estou aqui para ajudar. Precisa de mais alguma coisa?"
+_RESP_FAREWELL = "Até logo! Se precisar de mais alguma coisa, estarei aqui."
+_RESP_HOW = "Tudo bem, obrigado por perguntar! Como posso ajudar você hoje?"
+
+
+# Prioridade entre categorias quando a query casa com mais de uma (a detecção é
+# feita de uma vez, então a ordem só decide a resposta; ajustar aqui, não no fluxo)
+_CATEGORY_ORDER: Tuple[str, ...] = ("greetings", "about_assistant", "thanks", "farewells", "how_are_you")
+
+# Categoria -> (resposta, rótulo para log)
+_CATEGORY_RESPONSES: Dict[str, Tuple[str, str]] = {
+    "greetings": (_RESP_GREETING, "cumprimento"),
+    "about_assistant": (_RESP_ABOUT, "pergunta sobre assistente"),
+    "thanks": (_RESP_THANKS, "agradecimento"),
+    "farewells": (_RESP_FAREWELL, "despedida"),
+    "how_are_you": (_RESP_HOW, "estado"),
+}
+
+
+# Fragmentos literais presentes em todo gatilho social (exceto contexto operacional,
+# que só é usado para negar). Se nenhum aparece na query, ela não é social e a
+# varredura com regex é evitada - caso mais comum no tráfego real.
+_ANCHORS: Tuple[str, ...] = (
+    "oi", "olá", "e aí", "hey", "hello", "bom ", "boa ",
+    "qual", "quais", "quem", "você", "obrigad", "valeu", "agradeç",
+    "tchau", "até ", "falou", "flw", "bye", "como ", "tudo ", "beleza", "tranquilo",
+)
+
+_WORD_RE = re.compile(r'\w+')
+
+# Queries acima deste tamanho não passam pelo cache de _detect_category
+_CACHEABLE_QUERY_LENGTH = 256
+
+
+# Índice palavra -> categoria para as expressões de uma palavra
+_WORD_CATEGORY: Dict[str, str] = {
+    phrase: category
+    for category, phrases in _SOCIAL_CATEGORIES.items()
+    for phrase in phrases
+    if ' ' not in phrase
+}
+
+# Expressões de múltiplas palavras: teste de substring (C puro) e, só quando
+# presente, confirmação de limites de palavra. Cada expressão é verificada
+# isoladamente, então expressões sobrepostas ("tudo bom" / "bom dia") não se escondem
+_MULTI_WORD_PHRASES: Tuple[Tuple[str, str, Pattern[str]], ...] = tuple(
+    (category, phrase, re.compile(rf'\b{re.escape(phrase)}\b'))
+    for category, phrases in _SOCIAL_CATEGORIES.items()
+    for phrase in phrases
+    if ' ' in phrase
+)
+
+
+def _find_categories(query_lower: str) -> Set[str]:
+    """Retorna as categorias sociais presentes na query (sem parar na primeira)."""
+    found = set()
+    for token in _WORD_RE.findall(query_lower):
+        category = _WORD_CATEGORY.get(token)
+        if category is not None:
+            found.add(category)
+    for category, phrase, pattern in _MULTI_WORD_PHRASES:
+        if category not in found and phrase in query_lower and pattern.search(query_lower):
+            found.add(category)
+    return found
+
+
+@lru_cache(maxsize=4096)
+def _detect_category(query_lower: str) -> Optional[str]:
+    """
+    Retorna a categoria social da query (já normalizada) ou None.
+
+    Memoizada: reenvios e re-renderizações repetem a mesma string. Sem logs
+    aqui, para que acertos de cache não dependam de efeitos colaterais.
+    """
+    # PRIORIDADE: Se a query começa com "consultoria:", NÃO é interação social
+    # Deve ser processada como consultoria normal
+    if query_lower.startswith("consultoria:"):
+        return None
+
+    # Pré-filtro literal: descarta queries não sociais sem tocar no motor de regex
+    # (laço simples em vez de any(<gerador>): nenhum objeto criado por chamada)
+    for anchor in _ANCHORS:
+        if anchor in query_lower:
+            break
+    else:
+        return None
+
+    # Varredura única de todas as categorias
+    found = _find_categories(query_lower)
+
+    # Estado/Saúde só é social fora de contexto operacional ("como está a unidade?")
+    if "operational_context" in found:
+        found.discard("how_are_you")
+
+    # Perguntas sobre capacidades (análise de documentos) não são tratadas aqui:
+    # processadas pelo query_classifier e context_handler para suportar contexto de anexo
+    for category in _CATEGORY_ORDER:
+        if category in found:
+            return category
+
+    return None
+
+
 def detect_social_interaction(query: str) -> Optional[str]:
     """
     Detecta interações sociais que não precisam de RAG.
     Retorna resposta direta ou None se não for social.
-    
+
     Args:
         query: Texto da consulta do usuário
-        
+
     Returns:
         Optional[str]: Resposta direta se for interação social, None caso contrário
     """
     query_lower = query.lower().strip()
-    
-    # PRIORIDADE: Se a query começa com "consultoria:", NÃO é interação social
-    # Deve ser processada como consultoria normal
-    if query_lower.startswith("consultoria:"):
+
+    # Textos longos não são interação social típica e só inflariam o cache
+    if len(query_lower) > _CACHEABLE_QUERY_LENGTH:
+        category = _detect_category.__wrapped__(query_lower)
+    else:
+        category = _detect_category(query_lower)
+
+    if category is None:
         return None
-    
-    import re
-    
-    # Função auxiliar para busca exata de palavra/expressão
-    def has_exact(pattern_list, text):
-        for p in pattern_list:
-            # \b garante que seja uma palavra completa
-            if re.search(rf'\b{re.escape(p)}\b', text):
-                return True
-        return False
-
-    # 1. Cumprimentos
-    greetings = [
-        "oi", "olá", "e aí", "hey", "hello",
-        "bom dia", "boa tarde", "boa noite"
-    ]
-    if has_exact(greetings, query_lower):
-        logger.info(f"Interação social detectada: cumprimento - '{query}'")
-        return "Olá! Sou o Assistente Operacional da Treq. Como posso ajudar você hoje?"
-    
-    # 2. Perguntas sobre capacidades (análise de documentos)
-    # REMOVIDO: Agora processado pelo query_classifier e context_handler para suportar contexto de anexo
-    
-    # 3. Perguntas sobre o assistente
-    about_assistant = [
-        "qual seu nome", "quem é você", "o que você faz", "você é",
-        "como você se chama", "o que você pode fazer", "quais suas funções"
-    ]
-    if has_exact(about_assistant, query_lower):
-        logger.info(f"Interação social detectada: pergunta sobre assistente - '{query}'")
-        return (
-            "Sou o Assistente Operacional da Treq. "
-            "Posso ajudar com alertas operacionais, procedimentos, métricas e análise de causas. "
-            "Também consigo analisar documentos (PDF, DOCX, PPTX, Excel) para extrair informações operacionais."
-        )
-    
-    # 4. Agradecimentos
-    thanks = ["obrigado", "obrigada", "valeu", "agradeço"]
-    if has_exact(thanks, query_lower):
-        logger.info(f"Interação social detectada: agradecimento - '{query}'")
-        return "De nada! Estou aqui para ajudar. Precisa de mais alguma coisa?"
-    
-    # 5. Despedidas
-    farewells = ["tchau", "até logo", "até mais", "até breve", "falou", "flw", "bye"]
-    if has_exact(farewells, query_lower):
-        logger.info(f"Interação social detectada: despedida - '{query}'")
-        return "Até logo! Se precisar de mais alguma coisa, estarei aqui."
-    
-    # 6. Estado/Saúde
-    how_are_you = ["como vai", "tudo bem", "tudo bom", "como está", "beleza", "tranquilo"]
-    if has_exact(how_are_you, query_lower):
-        operational_context = ["operação", "unidade", "métrica", "alerta", "procedimento"]
-        if not has_exact(operational_context, query_lower):
-            return "Tudo bem, obrigado por perguntar! Como posso ajudar você hoje?"
-    
-    return None
 
+    response, label = _CATEGORY_RESPONSES[category]
+    logger.debug("Interação social detectada: {} - '{}'", label, query)
+    return response
@@ -6,7 +6,7 @@ para obter informações atualizadas, ao invés de usar apenas conhecimento
 estático do RAG.
 """
 from app.core.tools.base import Tool, ToolResult
-from app.core.tools.metrics_tool import MetricsTool
+from app.core.tools.metrics_tool import MetricsTool, get_metrics_tool
 
-__all__ = ["Tool", "ToolResult", "MetricsTool"]
+__all__ = ["Tool", "ToolResult", "MetricsTool", "get_metrics_tool"]
 
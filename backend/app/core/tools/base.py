@@ -10,9 +10,13 @@ from dataclasses import dataclass
 from loguru import logger
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ToolResult:
-    """Resultado de execução de uma Tool."""
+    """
+    Resultado de execução de uma Tool.
+    
+    Imutável: instâncias podem ser compartilhadas via cache entre requisições.
+    """
     success: bool
     data: Optional[Any] = None
     message: Optional[str] = None
@@ -6,16 +6,168 @@ ao invés de usar apenas conhecimento estático do RAG.
 
 Suporta cálculo de desvio estatístico para métricas como ticket médio, comparando valores atuais com a média histórica.
 """
-from typing import Optional
+import asyncio
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from loguru import logger
+from cachetools import TTLCache
 
 from app.core.tools.base import Tool, ToolResult
-from app.services.supabase_service import get_supabase_client
+from app.services.supabase_service import get_supabase_client, get_async_supabase_client
 from app.core.tools.metrics_utils import (
     calculate_period_filters,
-    process_generic_metrics
+    process_generic_metrics,
+    quote_filter_value
 )
-from app.core.tools.ticket_medio_calculator import calculate_ticket_medio_stats
+from app.core.tools.ticket_medio_calculator import (
+    calculate_ticket_medio_stats,
+    fetch_ticket_medio_history
+)
+
+# Cache global de resultados (MetricsTool é instanciada por requisição).
+# Chave: (metric_name, period, unit) - TTL curto para manter dados "em tempo real"
+metrics_result_cache = TTLCache(maxsize=256, ttl=60)
+
+
+@dataclass(slots=True)
+class _KeyLock:
+    """Lock de uma chave e número de corrotinas que o usam (inclusive aguardando)."""
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    users: int = 0
+
+
+# Locks por chave para evitar consultas duplicadas simultâneas (single-flight).
+# A entrada só sai do dicionário quando nenhuma corrotina a usa mais: remover
+# com alguém aguardando faria o próximo chamador criar outro lock e consultar em paralelo
+_metrics_locks: Dict[Tuple[str, str, Optional[str]], _KeyLock] = {}
+
+# Chaves do JSONB 'data' onde unidade e indicador podem aparecer (ordem de prioridade)
+_UNIT_KEYS = ('unidade', 'unit', 'codigo_unidade', 'filial', 'codigo_filial')
+_METRIC_KEYS = ('indicador', 'metric', 'metric_name', 'tipo', 'tipo_indicador')
+
+
+def _first_present(data: Dict[str, Any], keys: Tuple[str, ...]) -> Any:
+    """Retorna o primeiro valor não vazio entre as chaves, na ordem dada."""
+    return next((data[key] for key in keys if data.get(key)), None)
+
+
+def _apply_unit_filter(query, unit: Optional[str]):
+    """
+    Aplica no servidor o filtro de unidade sobre o JSONB 'data'.
+    
+    O filtro é um superconjunto do matching de unidade feito em Python, que
+    continua rodando como segunda passada sobre o resultado já reduzido. O
+    indicador não é filtrado aqui: o matching em Python aceita o indicador
+    armazenado contido no nome buscado ("ticket" para "ticket_medio"), o que
+    não tem equivalente em ilike.
+    
+    Args:
+        query: Query builder do Supabase
+        unit: Unidade específica (opcional)
+        
+    Returns:
+        Query com o filtro aplicado
+    """
+    if not unit or not unit.strip():
+        return query
+    
+    # "PE-Recife" deve casar com "Recife" e vice-versa: filtrar pela última parte
+    unit_last = unit.strip().split('-')[-1]
+    unit_pattern = quote_filter_value(f"*{unit_last}*")
+    # Caso inverso: registro "XX-<segmento>" cujo último segmento termina a unidade
+    # buscada ("XX-Cife" para "PE-Recife"), inclusive segmento vazio
+    suffixes = "|".join(re.escape(unit_last[i:]) for i in range(len(unit_last)))
+    suffix_regex = quote_filter_value(f"-({suffixes})?\\s*$" if suffixes else "-\\s*$")
+    query = query.or_(",".join(
+        f"data->>{key}.ilike.{unit_pattern},data->>{key}.imatch.{suffix_regex}"
+        for key in _UNIT_KEYS
+    ))
+    
+    return query
+
+
+async def _discard_task(task: asyncio.Task) -> None:
+    """Aguarda uma tarefa cujo resultado não será usado, registrando a falha em DEBUG."""
+    try:
+        await task
+    except Exception as e:
+        logger.debug("Tarefa descartada terminou com erro: {}", e)
+
+
+def _ticket_medio_handler(records, metric_name, period, unit, supabase, prefetched=None) -> Dict[str, Any]:
+    """Ticket médio: cálculo específico com análise de desvio estatístico."""
+    return calculate_ticket_medio_stats(records, period, unit, supabase, historical_pairs=prefetched)
+
+
+def _generic_handler(records, metric_name, period, unit, supabase, prefetched=None) -> Dict[str, Any]:
+    """Demais métricas: processamento genérico com estatísticas básicas."""
+    return process_generic_metrics(records, metric_name)
+
+
+# Handlers por tipo de métrica: (palavras que devem aparecer no nome, handler).
+# Primeira entrada cujas palavras estão todas no nome vence; senão, genérico.
+_METRIC_HANDLERS: Tuple[Tuple[Tuple[str, ...], Callable[..., Dict[str, Any]]], ...] = (
+    (("ticket", "medio"), _ticket_medio_handler),
+)
+
+
+def _select_metric_handler(metric_name: str) -> Callable[..., Dict[str, Any]]:
+    """Escolhe o handler de processamento para a métrica."""
+    metric_lower = metric_name.lower()
+    for keywords, handler in _METRIC_HANDLERS:
+        if all(keyword in metric_lower for keyword in keywords):
+            return handler
+    return _generic_handler
+
+
+# Fallback: janelas (dias) tentadas em ordem sobre uma única consulta sem limite
+# (o indicador só é filtrado em Python) e, se todas vazias, os mais recentes
+_FALLBACK_WINDOWS_DAYS = (30, 90)
+_FALLBACK_ANY_LIMIT = 100
+
+
+def _parse_valid_from(value: Any) -> Optional[datetime]:
+    """Converte valid_from (ISO, possivelmente com fuso) para datetime UTC ingênuo."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = (parsed - parsed.utcoffset()).replace(tzinfo=None)
+    return parsed
+
+
+def _pick_fallback_window(
+    rows: List[Dict[str, Any]],
+    now: datetime
+) -> Tuple[Optional[str], List[Dict[str, Any]]]:
+    """
+    Escolhe a janela mais estreita com dados entre os registros de fallback.
+    
+    Args:
+        rows: Registros da maior janela, ordenados por valid_from decrescente
+        now: Instante de referência (UTC)
+        
+    Returns:
+        Tupla (nome da janela, registros da janela); (None, []) se nenhuma tem dados
+    """
+    for days in _FALLBACK_WINDOWS_DAYS:
+        cutoff = now - timedelta(days=days)
+        window_rows = []
+        for row in rows:
+            valid_from = _parse_valid_from(row.get('valid_from'))
+            # Ordenação decrescente: o primeiro registro fora da janela encerra a busca
+            if valid_from is None or valid_from < cutoff:
+                break
+            window_rows.append(row)
+        if window_rows:
+            return f"{days} dias", window_rows
+    
+    return None, []
 
 
 class MetricsTool(Tool):
@@ -44,6 +196,9 @@ class MetricsTool(Tool):
         """
         Busca uma métrica específica.
         
+        Resultados são mantidos em cache por 60s; chamadas concorrentes para a
+        mesma chave aguardam a primeira consulta em vez de repeti-la.
+        
         Args:
             metric_name: Nome da métrica (ex: "pedidos_cancelados")
             period: Período ("today", "this_week", "this_month", "this_year")
@@ -53,6 +208,154 @@ class MetricsTool(Tool):
         Returns:
             ToolResult: Resultado com dados da métrica
         """
+        key = (metric_name, period, unit)
+        cached_result = metrics_result_cache.get(key)
+        if cached_result is not None:
+            logger.debug("🎯 Metrics Cache Hit: {}", key)
+            return cached_result
+        
+        key_lock = _metrics_locks.get(key)
+        if key_lock is None:
+            key_lock = _metrics_locks[key] = _KeyLock()
+        key_lock.users += 1
+        try:
+            async with key_lock.lock:
+                # Re-checar: outra corrotina pode ter preenchido o cache enquanto aguardávamos
+                cached_result = metrics_result_cache.get(key)
+                if cached_result is not None:
+                    return cached_result
+                
+                result = await self._fetch_metric(metric_name, period, unit)
+                
+                # Não cachear falhas por exceção (ex: Supabase indisponível)
+                if result.error is None:
+                    metrics_result_cache[key] = result
+                return result
+        finally:
+            key_lock.users -= 1
+            if key_lock.users == 0:
+                del _metrics_locks[key]
+    
+    async def execute_batch(self, metrics: List[Dict[str, Any]]) -> List[ToolResult]:
+        """
+        Busca agregados de várias métricas com uma chamada RPC por (period, unit).
+        
+        Usa a função get_metrics_agg (sql/create_metrics_agg_function.sql), que
+        calcula count/sum/avg/min/max no Postgres. Não inclui registros nem a
+        análise de desvio do ticket médio: para isso use execute().
+        
+        Difere de execute() em dois pontos: "value" é a média do período (em
+        execute() é o valor atual, último ou média dos três últimos), e não há
+        fallback de 30/90 dias quando o período está vazio.
+        
+        Args:
+            metrics: Lista de dicts com metric_name, period (padrão "today") e unit (opcional)
+            
+        Returns:
+            List[ToolResult]: Resultados na mesma ordem de `metrics`
+        """
+        results: List[Optional[ToolResult]] = [None] * len(metrics)
+        
+        # Agrupar por (period, unit): cada grupo vira uma única chamada RPC
+        groups: Dict[Tuple[str, Optional[str]], List[int]] = {}
+        for index, spec in enumerate(metrics):
+            if not spec.get("metric_name"):
+                results[index] = ToolResult(success=False, error="Parâmetros obrigatórios faltando: metric_name")
+                continue
+            groups.setdefault((spec.get("period", "today"), spec.get("unit")), []).append(index)
+        
+        # Grupos disjuntos: chamadas RPC concorrentes no cliente assíncrono
+        await asyncio.gather(*(
+            self._fetch_batch_group(metrics, period, unit, indexes, results)
+            for (period, unit), indexes in groups.items()
+        ))
+        
+        return results
+    
+    async def _fetch_batch_group(
+        self,
+        metrics: List[Dict[str, Any]],
+        period: str,
+        unit: Optional[str],
+        indexes: List[int],
+        results: List[Optional[ToolResult]]
+    ) -> None:
+        """
+        Executa a RPC get_metrics_agg para um grupo (period, unit) de execute_batch.
+        
+        Args:
+            metrics: Especificações recebidas por execute_batch
+            period: Período do grupo
+            unit: Unidade do grupo (opcional)
+            indexes: Posições de `metrics` que pertencem ao grupo
+            results: Lista de saída, preenchida nas posições de `indexes`
+        """
+        period_filters = calculate_period_filters(period)
+        if not period_filters:
+            for index in indexes:
+                results[index] = ToolResult(
+                    success=False,
+                    error=f"Período inválido: {period}. Use: today, this_week, this_month, this_year"
+                )
+            return
+        
+        metric_names = [metrics[index]["metric_name"] for index in indexes]
+        try:
+            supabase = await get_async_supabase_client()
+            response = await supabase.rpc("get_metrics_agg", {
+                "metric_names": metric_names,
+                "period_start": period_filters["start_date"],
+                "period_end": period_filters["end_date"],
+                "unit": unit
+            }).execute()
+        except Exception as e:
+            logger.error("Erro ao buscar métricas em lote {} (período: {}): {}", metric_names, period, e)
+            for index in indexes:
+                results[index] = ToolResult(success=False, error=str(e))
+            return
+        
+        rows = {row["metric_name"]: row for row in response.data or []}
+        for index, metric_name in zip(indexes, metric_names):
+            row = rows.get(metric_name)
+            if not row or not row.get("count"):
+                results[index] = ToolResult(
+                    success=False,
+                    message=f"Nenhum dado encontrado para '{metric_name}' no período '{period}'"
+                )
+                continue
+            
+            results[index] = ToolResult(
+                success=True,
+                data={
+                    "metric_name": metric_name,
+                    "value": row["avg"],
+                    "mean": row["avg"],
+                    "sum": row["sum"],
+                    "min": row["min"],
+                    "max": row["max"],
+                    "count": row["count"]
+                },
+                message=f"Métrica '{metric_name}' encontrada"
+            )
+    
+    async def _fetch_metric(
+        self,
+        metric_name: str,
+        period: str,
+        unit: Optional[str]
+    ) -> ToolResult:
+        """
+        Consulta o Supabase e processa a métrica (sem cache).
+        
+        Args:
+            metric_name: Nome da métrica
+            period: Período
+            unit: Unidade específica (opcional)
+            
+        Returns:
+            ToolResult: Resultado com dados da métrica
+        """
+        history_task: Optional[asyncio.Task] = None
         try:
             # Validar parâmetros
             is_valid, error = self.validate_params(["metric_name"], metric_name=metric_name)
@@ -69,7 +372,8 @@ class MetricsTool(Tool):
             
             # Construir query
             # Schema real: id, data_type, data (jsonb), version, valid_from, valid_until, created_at, updated_at
-            query = self.supabase.table("operational_data").select("*")
+            supabase = await get_async_supabase_client()
+            query = supabase.table("operational_data").select("*")
             
             # Aplicar filtros de período usando valid_from (timestamp)
             if period_filters.get("start_date"):
@@ -77,60 +381,57 @@ class MetricsTool(Tool):
             if period_filters.get("end_date"):
                 query = query.lte("valid_from", period_filters["end_date"])
             
+            # Ticket médio: o histórico só depende de (period, unit), então é buscado
+            # em paralelo à consulta principal (latência de um round-trip, não dois)
+            handler = _select_metric_handler(metric_name)
+            history_task = (
+                asyncio.create_task(asyncio.to_thread(fetch_ticket_medio_history, period, unit, self.supabase))
+                if handler is _ticket_medio_handler else None
+            )
+            
+            # Instante de referência único para consulta principal e fallback
+            now = datetime.utcnow()
+            validity_filter = f"valid_until.is.null,valid_until.gte.{now.isoformat()}"
+            
             # Filtrar apenas registros válidos (valid_until NULL ou futuro)
-            from datetime import datetime
-            query = query.or_("valid_until.is.null,valid_until.gte." + datetime.utcnow().isoformat())
+            query = query.or_(validity_filter)
             
-            # Aplicar filtro de unidade se fornecido (dentro do JSONB data)
-            # PostgREST suporta filtros em JSONB usando notação: data->>'campo'
-            # Como não podemos usar OR facilmente, vamos buscar sem filtro de unidade primeiro
-            # e filtrar depois no processamento (mais flexível para diferentes estruturas JSONB)
-            # Nota: Se necessário, podemos adicionar filtro JSONB depois quando soubermos a estrutura exata
+            # Filtrar unidade no servidor (JSONB data->>campo), trazendo só as linhas
+            # candidatas; o matching flexível abaixo refina unidade e indicador
+            query = _apply_unit_filter(query, unit)
             
             # Executar query
-            result = query.execute()
+            records = (await query.execute()).data
             
-            # Se não encontrou dados, tentar estratégias de fallback progressivas
-            if not result.data:
-                logger.info(f"Nenhum dado encontrado para '{metric_name}' no período '{period}', tentando fallbacks...")
-                from datetime import datetime, timedelta
+            # Se não encontrou dados no período, uma única consulta traz todos os registros
+            # válidos dos últimos 90 dias, agrupados aqui em 30d/90d. Sem limite: as linhas
+            # cobrem todos os indicadores, e cortar pelas mais recentes descartaria métricas
+            # menos frequentes antes do matching em Python
+            if not records:
+                logger.info("Nenhum dado encontrado para '{}' no período '{}', tentando fallback...", metric_name, period)
+                fallback_start = (now - timedelta(days=_FALLBACK_WINDOWS_DAYS[-1])).isoformat()
+                fallback_query = supabase.table("operational_data").select("*")
+                fallback_query = fallback_query.gte("valid_from", fallback_start)
+                fallback_query = fallback_query.or_(validity_filter)
+                fallback_query = _apply_unit_filter(fallback_query, unit)
+                fallback_query = fallback_query.order("valid_from", desc=True)
                 
-                # Fallback 1: Últimos 30 dias (sem filtro de período)
-                fallback_start_30d = (datetime.utcnow() - timedelta(days=30)).isoformat()
-                fallback_query_30d = self.supabase.table("operational_data").select("*")
-                fallback_query_30d = fallback_query_30d.gte("valid_from", fallback_start_30d)
-                now_iso = datetime.utcnow().isoformat()
-                fallback_query_30d = fallback_query_30d.or_(f"valid_until.is.null,valid_until.gte.{now_iso}")
+                fallback_rows = (await fallback_query.execute()).data or []
+                window, records = _pick_fallback_window(fallback_rows, now)
                 
-                fallback_result_30d = fallback_query_30d.execute()
-                if fallback_result_30d.data:
-                    logger.info(f"Fallback 30 dias encontrou {len(fallback_result_30d.data)} registros")
-                    result = fallback_result_30d
-                else:
-                    # Fallback 2: Últimos 90 dias
-                    logger.info(f"Fallback 30 dias vazio, tentando 90 dias...")
-                    fallback_start_90d = (datetime.utcnow() - timedelta(days=90)).isoformat()
-                    fallback_query_90d = self.supabase.table("operational_data").select("*")
-                    fallback_query_90d = fallback_query_90d.gte("valid_from", fallback_start_90d)
-                    fallback_query_90d = fallback_query_90d.or_(f"valid_until.is.null,valid_until.gte.{now_iso}")
-                    
-                    fallback_result_90d = fallback_query_90d.execute()
-                    if fallback_result_90d.data:
-                        logger.info(f"Fallback 90 dias encontrou {len(fallback_result_90d.data)} registros")
-                        result = fallback_result_90d
-                    else:
-                        # Fallback 3: Qualquer registro válido (sem filtro de data)
-                        logger.info(f"Fallback 90 dias vazio, tentando qualquer registro válido...")
-                        fallback_query_any = self.supabase.table("operational_data").select("*")
-                        fallback_query_any = fallback_query_any.or_(f"valid_until.is.null,valid_until.gte.{now_iso}")
-                        fallback_query_any = fallback_query_any.order("valid_from", desc=True).limit(100)
-                        
-                        fallback_result_any = fallback_query_any.execute()
-                        if fallback_result_any.data:
-                            logger.info(f"Fallback 'qualquer registro' encontrou {len(fallback_result_any.data)} registros")
-                            result = fallback_result_any
-            
-            if not result.data:
+                # Janelas vazias: qualquer registro válido (só os mais recentes)
+                if not records:
+                    window = "qualquer registro"
+                    any_query = supabase.table("operational_data").select("*")
+                    any_query = any_query.or_(validity_filter)
+                    any_query = _apply_unit_filter(any_query, unit)
+                    any_query = any_query.order("valid_from", desc=True).limit(_FALLBACK_ANY_LIMIT)
+                    records = (await any_query.execute()).data
+                
+                if records:
+                    logger.info("Fallback '{}' encontrou {} registros", window, len(records))
+            
+            if not records:
                 logger.warning(f"Nenhum dado encontrado para métrica '{metric_name}' no período '{period}'")
                 return ToolResult(
                     success=False,
@@ -139,79 +440,73 @@ class MetricsTool(Tool):
             
             # Extrair dados do JSONB 'data' e filtrar por metric_name e unit
             # O campo 'data' é JSONB e contém os dados reais
+            # Normalizações fixas calculadas uma vez, fora do laço
+            # Suportar múltiplos formatos de unidade: "PE-Recife", "Recife", "PE", etc.
+            unit_normalized = unit.strip().upper() if unit else None
+            unit_parts = unit_normalized.split('-') if unit_normalized else []
+            unit_suffix = unit_parts[-1] if len(unit_parts) > 1 else None
+            # Formas aceitas diretamente (teste de hash); demais casos caem no endswith
+            accepted_units = frozenset(filter(None, (unit_normalized, unit_suffix)))
+            # Registros repetem poucas unidades: decisão memoizada por valor bruto
+            unit_matches: Dict[str, bool] = {}
+            metric_lower = metric_name.lower()
+            metric_spaced = metric_lower.replace('_', ' ')
+            
             processed_records = []
-            for record in result.data:
+            for record in records:
                 json_data = record.get('data', {})
                 if not isinstance(json_data, dict):
                     continue
                 
                 # Extrair unidade do JSONB
-                record_unit = (
-                    json_data.get('unidade') or 
-                    json_data.get('unit') or 
-                    json_data.get('codigo_unidade') or
-                    json_data.get('filial') or
-                    json_data.get('codigo_filial')
-                )
+                record_unit = _first_present(json_data, _UNIT_KEYS)
                 
                 # Filtrar por unidade se especificada
-                # Suportar múltiplos formatos: "PE-Recife", "Recife", "PE", etc.
                 if unit:
-                    if record_unit:
+                    # Se unit foi especificado mas record não tem unidade, pular
+                    if not record_unit:
+                        continue
+                    
+                    matches_unit = unit_matches.get(record_unit)
+                    if matches_unit is None:
                         # Normalizar comparação (remover espaços, case insensitive)
-                        record_unit_normalized = record_unit.strip().upper()
-                        unit_normalized = unit.strip().upper()
-                        
-                        # Verificar correspondência exata ou parcial
                         # Ex: "PE-Recife" deve corresponder a "Recife" também
-                        unit_parts = unit_normalized.split('-')
+                        record_unit_normalized = record_unit.strip().upper()
                         matches_unit = (
-                            record_unit_normalized == unit_normalized or
-                            (len(unit_parts) > 1 and record_unit_normalized.endswith(unit_parts[-1])) or
+                            record_unit_normalized in accepted_units or
+                            (unit_suffix is not None and record_unit_normalized.endswith(unit_suffix)) or
                             ('-' in record_unit_normalized and unit_normalized.endswith(record_unit_normalized.split('-')[-1]))
                         )
-                        
-                        if not matches_unit:
-                            continue
-                    else:
-                        # Se unit foi especificado mas record não tem unidade, pular
+                        unit_matches[record_unit] = matches_unit
+                    if not matches_unit:
                         continue
                 
                 # Verificar se este registro corresponde à métrica buscada
                 # Pode estar em json_data['indicador'], json_data['metric'], etc.
-                indicador = (
-                    json_data.get('indicador') or 
-                    json_data.get('metric') or 
-                    json_data.get('metric_name') or
-                    json_data.get('tipo') or
-                    json_data.get('tipo_indicador')
-                )
+                indicador = _first_present(json_data, _METRIC_KEYS)
                 
                 # Verificar correspondência com metric_name
                 # Se há indicador, deve corresponder; se não há, aceitar todos
-                matches_metric = True
                 if indicador:
                     # Tentar correspondência flexível
                     indicador_lower = str(indicador).lower()
-                    metric_lower = metric_name.lower()
-                    matches_metric = (
+                    if not (
                         metric_lower in indicador_lower or
                         indicador_lower in metric_lower or
-                        metric_lower.replace('_', ' ') in indicador_lower.replace('_', ' ')
-                    )
+                        metric_spaced in indicador_lower.replace('_', ' ')
+                    ):
+                        continue
                 
-                if matches_metric:
-                    # Criar registro processado com estrutura esperada
-                    processed_record = {
-                        'valor': json_data.get('valor') or json_data.get('value'),
-                        'indicador': indicador or metric_name,
-                        'unidade': record_unit,
-                        'area': json_data.get('area'),
-                        'data': record.get('valid_from') or record.get('created_at'),
-                        # Incluir todos os campos do JSONB para compatibilidade
-                        **json_data
-                    }
-                    processed_records.append(processed_record)
+                # Criar registro processado com estrutura esperada
+                processed_records.append({
+                    'valor': json_data.get('valor') or json_data.get('value'),
+                    'indicador': indicador or metric_name,
+                    'unidade': record_unit,
+                    'area': json_data.get('area'),
+                    'data': record.get('valid_from') or record.get('created_at'),
+                    # Incluir todos os campos do JSONB para compatibilidade
+                    **json_data
+                })
             
             if not processed_records:
                 logger.warning(f"Nenhum registro processado para métrica '{metric_name}' após extração do JSONB")
@@ -220,22 +515,27 @@ class MetricsTool(Tool):
                     message=f"Nenhum dado válido encontrado para '{metric_name}' no período '{period}'"
                 )
             
+            # Histórico consumido aqui; o finally só trata a busca não consumida
+            prefetched = None
+            if history_task is not None:
+                task, history_task = history_task, None
+                prefetched = await task
+            
             # Processar dados com lógica específica por tipo de métrica
-            if "ticket" in metric_name.lower() and "medio" in metric_name.lower():
-                # Usar cálculo específico para ticket médio com análise de desvio estatístico
-                metrics_data = calculate_ticket_medio_stats(
-                    processed_records,
-                    period,
-                    unit,
-                    self.supabase
-                )
-            else:
-                # Usar processamento genérico com estatísticas básicas
-                metrics_data = process_generic_metrics(processed_records, metric_name)
+            # (handlers podem consultar o Supabase síncrono: rodam fora do event loop)
+            metrics_data = await asyncio.to_thread(
+                handler,
+                processed_records,
+                metric_name,
+                period,
+                unit,
+                self.supabase,
+                prefetched
+            )
             
             logger.info(
                 f"✅ Métrica '{metric_name}' encontrada: {metrics_data.get('value', metrics_data.get('current_value', 'N/A'))} "
-                f"(período: {period}, registros: {len(result.data)})"
+                f"(período: {period}, registros: {len(records)})"
             )
             
             return ToolResult(
@@ -245,11 +545,31 @@ class MetricsTool(Tool):
             )
             
         except Exception as e:
-            logger.error(f"Erro ao buscar métrica '{metric_name}': {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+            # Traceback anexado ao registro e formatado pelo loguru apenas nos sinks que o aceitam
+            logger.opt(exception=True).error("Erro ao buscar métrica '{}': {}", metric_name, e)
             return ToolResult(
                 success=False,
                 error=f"Erro ao buscar métrica: {str(e)}"
             )
+        finally:
+            # Retornos antecipados (sem registros) e erros não usam o histórico:
+            # aguardar a thread em vez de deixá-la órfã, sem propagar a falha dela
+            if history_task is not None:
+                await _discard_task(history_task)
 
+
+# Instância compartilhada: a tool não guarda estado por requisição
+_metrics_tool: Optional[MetricsTool] = None
+
+
+def get_metrics_tool() -> MetricsTool:
+    """
+    Retorna instância singleton da MetricsTool.
+    
+    Returns:
+        MetricsTool: Tool compartilhada (mesmo cliente Supabase e pool HTTP)
+    """
+    global _metrics_tool
+    if _metrics_tool is None:
+        _metrics_tool = MetricsTool()
+    return _metrics_tool
@@ -1,10 +1,13 @@
 """
 Funções auxiliares para processamento de métricas.
 """
+from bisect import bisect_right
 from typing import Dict, Any, List
 from datetime import datetime, timedelta
 from loguru import logger
-import statistics
+
+import numpy as np
+import pandas as pd
 
 
 def calculate_period_filters(period: str) -> Dict[str, Any]:
@@ -18,83 +21,131 @@ def calculate_period_filters(period: str) -> Dict[str, Any]:
         Dict com start_date e end_date, ou None se inválido
     """
     now = datetime.now()
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    # Calcular apenas o período pedido
+    period_lower = period.lower()
+    if period_lower == "today":
+        start = midnight
+    elif period_lower == "this_week":
+        start = midnight - timedelta(days=now.weekday())
+    elif period_lower == "this_month":
+        start = midnight.replace(day=1)
+    elif period_lower == "this_year":
+        start = midnight.replace(month=1, day=1)
+    else:
+        return None
     
-    period_map = {
-        "today": {
-            "start_date": now.replace(hour=0, minute=0, second=0, microsecond=0).isoformat(),
-            "end_date": now.isoformat()
-        },
-        "this_week": {
-            "start_date": (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0).isoformat(),
-            "end_date": now.isoformat()
-        },
-        "this_month": {
-            "start_date": now.replace(day=1, hour=0, minute=0, second=0, microsecond=0).isoformat(),
-            "end_date": now.isoformat()
-        },
-        "this_year": {
-            "start_date": now.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0).isoformat(),
-            "end_date": now.isoformat()
-        }
+    return {
+        "start_date": start.isoformat(),
+        "end_date": now.isoformat()
     }
-    
-    return period_map.get(period.lower())
 
 
-def extract_numeric_values(data: List[Dict[str, Any]], metric_name: str) -> List[float]:
+def quote_filter_value(value: str) -> str:
+    """Envolve valor em aspas para uso seguro dentro de or=(...) do PostgREST."""
+    escaped = value.replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+def extract_numeric_values(
+    data: List[Dict[str, Any]],
+    metric_name: str,
+    dtype: Any = np.float64
+) -> np.ndarray:
     """
     Extrai valores numéricos dos registros.
     
+    A conversão é vetorizada (pandas.to_numeric): valores não numéricos viram
+    NaN e são descartados, sem try/except por elemento. Aceita o mesmo que
+    float(), exceto NaN, que é descartado em vez de contaminar as estatísticas.
+    
     Args:
         data: Lista de registros
         metric_name: Nome da métrica (para buscar campos específicos)
+        dtype: Tipo do array (np.float32 reduz memória em agregações não críticas;
+            valores monetários exibidos ao usuário devem manter float64)
         
     Returns:
-        Lista de valores numéricos extraídos
+        Array com os valores numéricos extraídos (na ordem dos registros)
     """
-    values = []
-    for record in data:
-        # Tentar diferentes campos comuns para valores
-        value = (
-            record.get('valor') or 
-            record.get('value') or 
-            record.get(metric_name) or
-            record.get('ticket_medio') or
-            record.get('metric_value')
-        )
-        if value is not None:
+    # Tentar diferentes campos comuns para valores
+    raw = [
+        record.get('valor') or
+        record.get('value') or
+        record.get(metric_name) or
+        record.get('ticket_medio') or
+        record.get('metric_value')
+        for record in data
+    ]
+    if not raw:
+        return np.empty(0, dtype=dtype)
+    
+    numeric = pd.to_numeric(pd.Series(raw, dtype=object), errors='coerce')
+    # to_numeric rejeita formas que float() aceita ("1_000", dígitos não ASCII):
+    # só as strings rejeitadas passam por float(), uma a uma
+    for index in np.flatnonzero(numeric.isna().to_numpy()):
+        value = raw[index]
+        if isinstance(value, str):
             try:
-                float_val = float(value)
-                values.append(float_val)
-            except (ValueError, TypeError):
-                continue
-    return values
+                numeric.iat[index] = float(value)
+            except ValueError:
+                pass
+    return numeric.dropna().to_numpy(dtype=dtype)
 
 
-def calculate_statistics(values: List[float]) -> Dict[str, float]:
+def fast_median(arr: np.ndarray) -> float:
     """
-    Calcula estatísticas básicas de uma lista de valores.
+    Mediana por seleção parcial (np.partition, O(n)) em vez de ordenação completa.
     
     Args:
-        values: Lista de valores numéricos
+        arr: Array numérico não vazio (não é modificado)
+        
+    Returns:
+        Mediana como float (média dos dois centrais em tamanho par)
+    """
+    mid = arr.size // 2
+    if arr.size % 2:
+        return float(np.partition(arr, mid)[mid])
+    lower, upper = np.partition(arr, (mid - 1, mid))[mid - 1:mid + 1]
+    return (float(lower) + float(upper)) / 2.0
+
+
+def calculate_statistics(values: np.ndarray) -> Dict[str, float]:
+    """
+    Calcula estatísticas básicas de uma lista de valores (reduções NumPy).
+    
+    Args:
+        values: Valores numéricos (array ou lista)
         
     Returns:
         Dict com mean, median, std_dev
     """
-    if not values:
+    if len(values) == 0:
         return {"mean": 0.0, "median": 0.0, "std_dev": 0.0}
     
-    mean = statistics.mean(values)
-    median = statistics.median(values)
-    std_dev = statistics.stdev(values) if len(values) > 1 else 0.0
+    # Arrays float32 são aceitos sem cópia; as reduções acumulam em float64
+    arr = np.asarray(values)
+    if arr.dtype not in (np.float32, np.float64):
+        arr = arr.astype(np.float64)
     
     return {
-        "mean": mean,
-        "median": median,
-        "std_dev": std_dev
+        "mean": float(arr.mean(dtype=np.float64)),
+        "median": fast_median(arr),
+        "std_dev": float(arr.std(ddof=1, dtype=np.float64)) if arr.size > 1 else 0.0
     }
 
 
+# Limites (em desvios padrão, inclusivos) e rótulos correspondentes por faixa
+_DEVIATION_THRESHOLDS = (2.0, 3.0)
+_DEVIATION_LEVELS = (
+    ("NORMAL", "Dentro do normal"),
+    ("ATENÇÃO", "Nível 1 (desvio moderado - acima do normal)"),
+    ("CRÍTICO", "Nível 2 (desvio grande - muito acima do normal)"),
+)
+_DEVIATION_THRESHOLDS_ARRAY = np.array(_DEVIATION_THRESHOLDS)
+
+
 def calculate_deviation_level(deviation: float) -> tuple[str, str]:
     """
     Calcula nível de alerta baseado no desvio estatístico.
@@ -106,13 +157,26 @@ def calculate_deviation_level(deviation: float) -> tuple[str, str]:
         Tuple[alert_level, threshold_level]
     """
     abs_deviation = abs(deviation)
+    # NaN nunca atinge um limite: NORMAL
+    if abs_deviation != abs_deviation:
+        return _DEVIATION_LEVELS[0]
+    return _DEVIATION_LEVELS[bisect_right(_DEVIATION_THRESHOLDS, abs_deviation)]
+
+
+def calculate_deviation_levels(deviations: np.ndarray) -> List[tuple[str, str]]:
+    """
+    Versão vetorizada de calculate_deviation_level para vários desvios.
     
-    if abs_deviation >= 3.0:
-        return ("CRÍTICO", "Nível 2 (desvio grande - muito acima do normal)")
-    elif abs_deviation >= 2.0:
-        return ("ATENÇÃO", "Nível 1 (desvio moderado - acima do normal)")
-    else:
-        return ("NORMAL", "Dentro do normal")
+    Args:
+        deviations: Desvios estatísticos (números de desvios padrão)
+        
+    Returns:
+        Lista de Tuple[alert_level, threshold_level] na mesma ordem
+    """
+    abs_deviations = np.abs(np.asarray(deviations, dtype=np.float64))
+    indexes = np.searchsorted(_DEVIATION_THRESHOLDS_ARRAY, abs_deviations, side="right")
+    indexes[np.isnan(abs_deviations)] = 0
+    return [_DEVIATION_LEVELS[index] for index in indexes]
 
 
 def process_generic_metrics(data: List[Dict[str, Any]], metric_name: str) -> Dict[str, Any]:
@@ -129,7 +193,7 @@ def process_generic_metrics(data: List[Dict[str, Any]], metric_name: str) -> Dic
     # Extrair valores numéricos
     values = extract_numeric_values(data, metric_name)
     
-    if not values:
+    if values.size == 0:
         # Se não há valores numéricos, retornar estrutura básica
         return {
             "metric_name": metric_name,
@@ -145,7 +209,7 @@ def process_generic_metrics(data: List[Dict[str, Any]], metric_name: str) -> Dic
     std_dev = stats["std_dev"]
     
     # Valor atual (último valor ou média dos últimos valores)
-    current_value = values[-1] if len(values) == 1 else statistics.mean(values[-3:]) if len(values) >= 3 else mean
+    current_value = float(values[-1]) if values.size == 1 else float(values[-3:].mean()) if values.size >= 3 else mean
     
     # Calcular desvio estatístico (se há desvio padrão)
     deviation_from_normal = None
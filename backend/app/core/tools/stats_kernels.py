@@ -0,0 +1,86 @@
+"""
+Kernels numéricos para as estatísticas de métricas (ticket médio).
+
+Ordem de preferência:
+1. Numba JIT com cache em disco (NUMBA_CACHE_DIR), compilado na importação
+2. Reduções NumPy com resultado equivalente (sem Numba)
+"""
+from typing import Tuple
+
+import numpy as np
+from loguru import logger
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+# Corpo do kernel em Python puro, compilado por njit (abaixo)
+
+def _fused_loop(values, is_hist):
+    # Uma passada: Welford para o histórico e média incremental para o atual
+    hist_n = 0
+    hist_mean = 0.0
+    hist_m2 = 0.0
+    current_n = 0
+    current_mean = 0.0
+    for i in range(values.shape[0]):
+        x = values[i]
+        if is_hist[i]:
+            hist_n += 1
+            delta = x - hist_mean
+            hist_mean += delta / hist_n
+            hist_m2 += delta * (x - hist_mean)
+        else:
+            current_n += 1
+            current_mean += (x - current_mean) / current_n
+    hist_std = (hist_m2 / (hist_n - 1)) ** 0.5 if hist_n > 1 else 0.0
+    return hist_mean, hist_std, current_mean
+
+
+def _mean_std_numpy(values: np.ndarray) -> Tuple[float, float]:
+    """Média e desvio padrão amostral via NumPy (fallback sem Numba)."""
+    n = values.shape[0]
+    if n == 0:
+        return 0.0, 0.0
+    mean = float(values.mean(dtype=np.float64))
+    std = float(values.std(ddof=1, dtype=np.float64)) if n > 1 else 0.0
+    return mean, std
+
+
+def _fused_stats_numpy(values: np.ndarray, is_hist: np.ndarray) -> Tuple[float, float, float]:
+    """Estatísticas histórico/atual via NumPy (fallback sem Numba)."""
+    hist_mean, hist_std = _mean_std_numpy(values[is_hist])
+    current = values[~is_hist]
+    current_mean = float(current.mean(dtype=np.float64)) if current.shape[0] else 0.0
+    return hist_mean, hist_std, current_mean
+
+
+if NUMBA_AVAILABLE:
+    _fused_stats_jit = njit(cache=True)(_fused_loop)
+
+
+def fused_stats(values: np.ndarray, is_hist: np.ndarray) -> Tuple[float, float, float]:
+    """
+    Calcula média/desvio do histórico e média do período atual em uma passada.
+
+    Args:
+        values: Array float32/float64 com todos os valores
+        is_hist: Máscara booleana (True = valor histórico), mesmo tamanho de `values`
+
+    Returns:
+        Tuple[hist_mean, hist_std, current_mean] (0.0 para grupos vazios)
+    """
+    if NUMBA_AVAILABLE:
+        hist_mean, hist_std, current_mean = _fused_stats_jit(values, is_hist)
+        return float(hist_mean), float(hist_std), float(current_mean)
+    return _fused_stats_numpy(values, is_hist)
+
+
+# Pré-compilar na importação para não pagar o JIT na primeira requisição
+# (com cache=True, workers reciclados reaproveitam o código em NUMBA_CACHE_DIR)
+if NUMBA_AVAILABLE:
+    fused_stats(np.zeros(4, dtype=np.float64), np.array([True, True, False, False]))
+    logger.debug("Kernel estatístico compilado com Numba")
@@ -1,23 +1,34 @@
 """
 Calculador específico para ticket médio com análise estatística avançada.
 """
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import chain
 from loguru import logger
 import statistics
 
+import numpy as np
+
 from app.core.tools.metrics_utils import (
     calculate_period_filters,
     extract_numeric_values,
-    calculate_deviation_level
+    calculate_deviation_level,
+    quote_filter_value
 )
+from app.core.tools.stats_kernels import fused_stats
+
+# Chaves do JSONB consultadas no histórico (ordem de prioridade)
+_HISTORICAL_UNIT_KEYS = ('unidade', 'unit', 'codigo_unidade', 'filial')
+_HISTORICAL_METRIC_KEYS = ('indicador', 'metric', 'metric_name')
 
 
 def calculate_ticket_medio_stats(
     data: List[Dict[str, Any]],
     period: str,
     unit: Optional[str],
-    supabase_client: Any
+    supabase_client: Any,
+    historical_pairs: Optional[List[Tuple[Optional[float], Any]]] = None
 ) -> Dict[str, Any]:
     """
     Calcula estatísticas específicas para ticket médio com análise de desvio estatístico.
@@ -30,30 +41,27 @@ def calculate_ticket_medio_stats(
         period: Período atual ("today", "this_week", "this_month", "this_year")
         unit: Unidade específica (opcional)
         supabase_client: Cliente Supabase para buscar dados históricos
+        historical_pairs: Histórico já buscado (fetch_ticket_medio_history); se None, busca aqui
         
     Returns:
         Dict com estatísticas completas incluindo análise de desvio estatístico
     """
     try:
-        # Buscar dados históricos (12 meses) para comparação estatística
-        now = datetime.now()
-        current_period_start = calculate_period_filters(period)
-        historical_start = (now - timedelta(days=365)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        # Janela histórica (12 meses) para comparação estatística
+        historical_start, current_start_dt = _historical_window(period)
         
-        # Calcular data de corte para histórico (antes do período atual)
-        current_start_dt = _extract_start_date(current_period_start, now)
-        
-        # Buscar dados históricos
-        historical_data = _fetch_historical_data(
-            supabase_client,
-            historical_start,
-            current_start_dt,
-            unit
-        )
+        # Buscar dados históricos (se não vieram pré-buscados pelo chamador)
+        if historical_pairs is None:
+            historical_pairs = _fetch_historical_data(
+                supabase_client,
+                historical_start,
+                current_start_dt,
+                unit
+            )
         
         # Separar valores históricos e atuais
         historical_values, current_values = _separate_historical_and_current(
-            historical_data,
+            historical_pairs,
             data,
             current_start_dt
         )
@@ -69,12 +77,19 @@ def calculate_ticket_medio_stats(
                     "value": len(data)
                 }
         
-        # Calcular estatísticas
-        hist_mean = statistics.mean(historical_values)
-        hist_std = statistics.stdev(historical_values) if len(historical_values) > 1 else 0
+        # Calcular estatísticas do histórico e do atual em uma única passada
+        n_hist = len(historical_values)
+        values = np.fromiter(
+            chain(historical_values, current_values),
+            dtype=np.float64,
+            count=n_hist + len(current_values)
+        )
+        is_hist = np.zeros(values.shape[0], dtype=np.bool_)
+        is_hist[:n_hist] = True
+        hist_mean, hist_std, current_values_mean = fused_stats(values, is_hist)
         
         # Valor atual (média do período atual ou último valor)
-        current_mean = statistics.mean(current_values) if current_values else (
+        current_mean = current_values_mean if current_values else (
             historical_values[-1] if historical_values else hist_mean
         )
         
@@ -109,26 +124,64 @@ def calculate_ticket_medio_stats(
             "historical_periods": len(historical_values),
             "current_periods": len(current_values),
             "formatted_message": formatted_message,
-            "count": len(historical_data) + len(data),
+            "count": len(historical_pairs) + len(data),
             "records": data
         }
         
     except Exception as e:
-        logger.error(f"Erro ao calcular estatísticas de ticket médio: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
+        logger.opt(exception=True).error("Erro ao calcular estatísticas de ticket médio: {}", e)
         raise
 
 
+def fetch_ticket_medio_history(
+    period: str,
+    unit: Optional[str],
+    supabase_client: Any
+) -> List[Tuple[Optional[float], Any]]:
+    """
+    Busca o histórico de ticket médio usado por calculate_ticket_medio_stats.
+    
+    Depende só de (period, unit), então o chamador pode disparar esta consulta
+    em paralelo à dos dados atuais e repassar o resultado em `historical_pairs`.
+    
+    Args:
+        period: Período atual ("today", "this_week", "this_month", "this_year")
+        unit: Unidade específica (opcional)
+        supabase_client: Cliente Supabase síncrono
+        
+    Returns:
+        Lista de pares (valor, valid_from); vazia em caso de erro
+    """
+    historical_start, current_start_dt = _historical_window(period)
+    return _fetch_historical_data(supabase_client, historical_start, current_start_dt, unit)
+
+
+def _historical_window(period: str) -> Tuple[datetime, datetime]:
+    """Início da janela histórica (12 meses) e data de corte do período atual."""
+    now = datetime.now()
+    historical_start = (now - timedelta(days=365)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    
+    # Calcular data de corte para histórico (antes do período atual)
+    current_start_dt = _extract_start_date(calculate_period_filters(period), now)
+    return historical_start, current_start_dt
+
+
 def _extract_start_date(current_period_start: Optional[Dict[str, Any]], now: datetime) -> datetime:
     """Extrai data de início do período atual."""
     if current_period_start:
         current_start_str = current_period_start.get("start_date")
-        try:
-            if isinstance(current_start_str, str):
-                return datetime.fromisoformat(current_start_str.split('+')[0].split('T')[0])
-        except:
-            pass
+        if isinstance(current_start_str, str):
+            # Guarda de formato (YYYY-MM-DD) em vez de exceção como controle de fluxo
+            day = current_start_str.split('+')[0].split('T')[0]
+            if (
+                len(day) == 10 and day[4] == '-' and day[7] == '-'
+                and day[:4].isdigit() and day[5:7].isdigit() and day[8:].isdigit()
+            ):
+                try:
+                    return datetime.fromisoformat(day)
+                except ValueError:
+                    # Formato correto mas data inexistente (ex.: 2024-02-30)
+                    pass
     return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
 
 
@@ -137,113 +190,116 @@ def _fetch_historical_data(
     historical_start: datetime,
     current_start_dt: datetime,
     unit: Optional[str]
-) -> List[Dict[str, Any]]:
-    """Busca dados históricos do Supabase."""
+) -> List[Tuple[Optional[float], Any]]:
+    """Busca dados históricos do Supabase como pares (valor, valid_from)."""
     try:
         # Schema real: usar valid_from para filtros de período
-        query_historical = supabase_client.table("operational_data").select("*")
+        # Apenas as colunas usadas abaixo
+        query_historical = supabase_client.table("operational_data").select("valid_from,data")
         query_historical = query_historical.gte("valid_from", historical_start.isoformat())
         query_historical = query_historical.lt("valid_from", current_start_dt.isoformat())
         
-        # Nota: Filtro de unidade será feito após extrair dados do JSONB
-        # PostgREST tem limitações com filtros JSONB complexos
-        
-        historical_result = query_historical.execute()
-        historical_data = historical_result.data if historical_result.data else []
-        
-        # Extrair dados do JSONB e filtrar apenas ticket médio e unidade
-        processed_data = []
-        for record in historical_data:
-            json_data = record.get('data', {})
-            if not isinstance(json_data, dict):
-                continue
-            
-            # Extrair unidade do JSONB
-            record_unit = (
-                json_data.get('unidade') or 
-                json_data.get('unit') or 
-                json_data.get('codigo_unidade') or
-                json_data.get('filial')
+        # Filtros JSONB no servidor (superconjunto do filtro abaixo, que refina o resultado)
+        query_historical = query_historical.or_(
+            ",".join(f"data->>{key}.ilike.*ticket*" for key in _HISTORICAL_METRIC_KEYS)
+        )
+        if unit and unit.strip():
+            unit_pattern = quote_filter_value(f"*{unit.strip()}*")
+            # Registros sem unidade (ausente ou "") também passam no filtro em Python
+            no_unit = ",".join(
+                f'or(data->>{key}.is.null,data->>{key}.eq."")' for key in _HISTORICAL_UNIT_KEYS
             )
-            
-            # Filtrar por unidade se especificada
-            if unit and record_unit:
-                if record_unit.strip().upper() != unit.strip().upper():
-                    continue
-            
-            indicador = (
-                json_data.get('indicador') or 
-                json_data.get('metric') or 
-                json_data.get('metric_name')
+            query_historical = query_historical.or_(
+                ",".join(f"data->>{key}.ilike.{unit_pattern}" for key in _HISTORICAL_UNIT_KEYS)
+                + f",and({no_unit})"
             )
-            
-            # Filtrar apenas ticket médio
-            if indicador and 'ticket' in str(indicador).lower():
-                processed_record = {
-                    'valor': json_data.get('valor') or json_data.get('value'),
-                    'indicador': indicador,
-                    'unidade': record_unit,
-                    'data': record.get('valid_from'),
-                    **json_data
-                }
-                processed_data.append(processed_record)
         
-        return processed_data
+        historical_result = query_historical.execute()
+        return list(_iter_historical_pairs(historical_result.data or [], unit))
     except Exception as e:
-        logger.warning(f"Erro ao buscar dados históricos: {e}. Usando apenas dados atuais.")
-        import traceback
-        logger.debug(traceback.format_exc())
+        logger.warning("Erro ao buscar dados históricos: {}. Usando apenas dados atuais.", e)
+        # Stack trace só é montado se o nível DEBUG estiver habilitado
+        logger.opt(exception=True).debug("Detalhes do erro ao buscar dados históricos")
         return []
 
 
+def _iter_historical_pairs(
+    rows: List[Dict[str, Any]],
+    unit: Optional[str]
+) -> Iterator[Tuple[Optional[float], Any]]:
+    """
+    Extrai do JSONB apenas o necessário: (valor numérico ou None, valid_from).
+    
+    Filtra ticket médio e unidade sem montar um dict intermediário por registro.
+    """
+    # Invariante do laço: unidade pedida normalizada uma única vez
+    unit_norm = unit.strip().upper() if unit else None
+    
+    for record in rows:
+        json_data = record.get('data', {})
+        if not isinstance(json_data, dict):
+            continue
+        
+        # Extrair unidade do JSONB
+        record_unit = (
+            json_data.get('unidade') or 
+            json_data.get('unit') or 
+            json_data.get('codigo_unidade') or
+            json_data.get('filial')
+        )
+        
+        # Filtrar por unidade se especificada
+        if unit_norm is not None and record_unit and record_unit.strip().upper() != unit_norm:
+            continue
+        
+        indicador = (
+            json_data.get('indicador') or 
+            json_data.get('metric') or 
+            json_data.get('metric_name')
+        )
+        
+        # Filtrar apenas ticket médio
+        if isinstance(indicador, str) and 'ticket' in indicador.lower():
+            yield _record_value(json_data), record.get('valid_from')
+
+
 def _separate_historical_and_current(
-    historical_data: List[Dict[str, Any]],
+    historical_pairs: List[Tuple[Optional[float], Any]],
     current_data: List[Dict[str, Any]],
     current_start_dt: datetime
 ) -> tuple[List[float], List[float]]:
     """Separa valores históricos e atuais dos dados."""
-    historical_values = []
+    # Registros históricos: origem conhecida, já convertidos em valor
+    historical_values = [value for value, _ in historical_pairs if value is not None]
     current_values = []
-    all_data = historical_data + current_data
     
-    for record in all_data:
-        is_historical = record in historical_data
-        record_date = record.get('data') or record.get('date')
-        value = record.get('valor') or record.get('value') or record.get('ticket_medio')
-        
-        if value is None:
+    for record in current_data:
+        float_val = _record_value(record)
+        if float_val is None:
             continue
         
-        try:
-            float_val = float(value)
-            
-            if is_historical:
-                historical_values.append(float_val)
-            else:
-                # Verificar se realmente é do período atual
-                if record_date and current_start_dt:
-                    try:
-                        if isinstance(record_date, str):
-                            record_date_dt = datetime.fromisoformat(
-                                record_date.replace('Z', '+00:00').split('+')[0].split('T')[0]
-                            )
-                        else:
-                            record_date_dt = record_date
-                        
-                        if record_date_dt >= current_start_dt:
-                            current_values.append(float_val)
-                        else:
-                            historical_values.append(float_val)
-                    except:
-                        current_values.append(float_val)
+        # Verificar se realmente é do período atual
+        record_date = record.get('data') or record.get('date')
+        if record_date and current_start_dt:
+            try:
+                if isinstance(record_date, str):
+                    record_date_dt = _parse_record_day(record_date)
                 else:
+                    record_date_dt = record_date
+                
+                if record_date_dt >= current_start_dt:
                     current_values.append(float_val)
-        except (ValueError, TypeError):
-            continue
+                else:
+                    historical_values.append(float_val)
+            except (ValueError, TypeError):
+                current_values.append(float_val)
+        else:
+            current_values.append(float_val)
     
     # Fallback: se não há histórico separado, usar split temporal
-    if not historical_values and len(all_data) > 6:
-        all_values = extract_numeric_values(all_data, "ticket_medio")
+    # (sem histórico com valor, só os registros atuais contribuem com valores)
+    if not historical_values and len(historical_pairs) + len(current_data) > 6:
+        all_values = extract_numeric_values(current_data, "ticket_medio").tolist()
         if all_values and len(all_values) >= 6:
             split_idx = max(6, int(len(all_values) * 0.75))
             historical_values = all_values[:split_idx]
@@ -252,9 +308,30 @@ def _separate_historical_and_current(
     return historical_values, current_values
 
 
+@lru_cache(maxsize=8192)
+def _parse_record_day(record_date: str) -> datetime:
+    """
+    Converte a data ISO do registro para datetime (dia, sem fuso).
+    
+    Memoizada: séries históricas repetem as mesmas datas em muitos registros.
+    """
+    return datetime.fromisoformat(record_date.replace('Z', '+00:00').split('+')[0].split('T')[0])
+
+
+def _record_value(record: Dict[str, Any]) -> Optional[float]:
+    """Valor numérico do registro (valor/value/ticket_medio) ou None."""
+    value = record.get('valor') or record.get('value') or record.get('ticket_medio')
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return None
+
+
 def _fallback_values_split(data: List[Dict[str, Any]]) -> tuple[List[float], List[float]]:
     """Fallback quando não há dados históricos suficientes."""
-    all_values = extract_numeric_values(data, "ticket_medio")
+    all_values = extract_numeric_values(data, "ticket_medio").tolist()
     if all_values and len(all_values) >= 2:
         historical_values = all_values[:-1] if len(all_values) > 2 else all_values
         current_values = all_values[-1:] if len(all_values) > 2 else [statistics.mean(all_values)]
@@ -5,6 +5,8 @@ Fornece wrappers para rastrear chamadas LLM e pipeline RAG.
 """
 import time
 import uuid
+from collections import deque
+from dataclasses import dataclass
 from typing import Any, Callable, Dict, Optional
 from functools import wraps
 from contextlib import contextmanager
@@ -12,17 +14,36 @@ from loguru import logger
 
 from app.core.langsmith_config import is_langsmith_enabled, get_langsmith_client
 
+# LangSmith é opcional: importado uma única vez, não a cada chamada rastreada
+try:
+    from langsmith import traceable as _traceable, trace as _trace
+except ImportError:
+    _traceable = None
+    _trace = None
+
+# Estado do LangSmith resolvido uma vez (configuração não muda em runtime)
+_langsmith_enabled: Optional[bool] = None
+
+
+def _enabled() -> bool:
+    """Retorna is_langsmith_enabled() memoizado no módulo."""
+    global _langsmith_enabled
+    if _langsmith_enabled is None:
+        _langsmith_enabled = is_langsmith_enabled()
+    return _langsmith_enabled
+
+
+def reset_langsmith_cache() -> None:
+    """Descarta o estado memoizado (ex: testes que alteram a configuração)."""
+    global _langsmith_enabled
+    _langsmith_enabled = None
+
 
 def _get_tracer():
     """Retorna o tracer se LangSmith estiver habilitado."""
-    if not is_langsmith_enabled():
-        return None
-    
-    try:
-        from langsmith import traceable
-        return traceable
-    except ImportError:
+    if not _enabled():
         return None
+    return _traceable
 
 
 def trace_llm_call(
@@ -44,26 +65,26 @@ def trace_llm_call(
             ...
     """
     def decorator(func: Callable) -> Callable:
+        # Função traceable criada uma vez por função decorada (na primeira chamada rastreada)
+        traced_func = None
+        
         @wraps(func)
         def wrapper(*args, **kwargs):
-            if not is_langsmith_enabled():
+            nonlocal traced_func
+            if _traceable is None or not _enabled():
                 return func(*args, **kwargs)
             
             try:
-                from langsmith import traceable
-                
-                # Criar função traceable
-                traced_func = traceable(
-                    name=name,
-                    run_type=run_type,
-                    metadata=metadata or {}
-                )(func)
+                if traced_func is None:
+                    traced_func = _traceable(
+                        name=name,
+                        run_type=run_type,
+                        metadata=metadata or {}
+                    )(func)
                 
                 return traced_func(*args, **kwargs)
-            except ImportError:
-                return func(*args, **kwargs)
             except Exception as e:
-                logger.debug(f"Erro no tracing: {e}")
+                logger.debug("Erro no tracing: {}", e)
                 return func(*args, **kwargs)
         
         return wrapper
@@ -87,25 +108,26 @@ def trace_rag_pipeline(
             ...
     """
     def decorator(func: Callable) -> Callable:
+        # Função traceable criada uma vez por função decorada (na primeira chamada rastreada)
+        traced_func = None
+        
         @wraps(func)
         def wrapper(*args, **kwargs):
-            if not is_langsmith_enabled():
+            nonlocal traced_func
+            if _traceable is None or not _enabled():
                 return func(*args, **kwargs)
             
             try:
-                from langsmith import traceable
-                
-                traced_func = traceable(
-                    name=name,
-                    run_type="retriever",
-                    metadata=metadata or {}
-                )(func)
+                if traced_func is None:
+                    traced_func = _traceable(
+                        name=name,
+                        run_type="retriever",
+                        metadata=metadata or {}
+                    )(func)
                 
                 return traced_func(*args, **kwargs)
-            except ImportError:
-                return func(*args, **kwargs)
             except Exception as e:
-                logger.debug(f"Erro no tracing RAG: {e}")
+                logger.debug("Erro no tracing RAG: {}", e)
                 return func(*args, **kwargs)
         
         return wrapper
@@ -132,7 +154,7 @@ def trace_span(
         with trace_span("process_query", inputs={"query": query}):
             result = process(query)
     """
-    if not is_langsmith_enabled():
+    if _trace is None or not _enabled():
         yield None
         return
     
@@ -140,9 +162,7 @@ def trace_span(
     run_id = str(uuid.uuid4())
     
     try:
-        from langsmith import trace
-        
-        with trace(
+        with _trace(
             name=name,
             run_type=run_type,
             inputs=inputs or {},
@@ -150,14 +170,39 @@ def trace_span(
         ) as run:
             yield run
             
-    except ImportError:
-        yield None
     except Exception as e:
-        logger.debug(f"Erro no trace_span: {e}")
+        logger.debug("Erro no trace_span: {}", e)
         yield None
     finally:
         elapsed = time.time() - start_time
-        logger.debug(f"[TRACE] {name} concluído em {elapsed:.2f}s")
+        logger.debug("[TRACE] {} concluído em {:.2f}s", name, elapsed)
+
+
+@dataclass(slots=True)
+class LLMMetric:
+    """Registro de uma chamada LLM (sem __dict__ por instância)."""
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    latency_ms: float
+    success: bool
+    error: Optional[str]
+    timestamp: float
+    
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+@dataclass(slots=True)
+class RAGMetric:
+    """Registro de uma busca RAG (sem __dict__ por instância)."""
+    query_length: int
+    num_results: int
+    top_similarity: float
+    latency_ms: float
+    search_type: str
+    timestamp: float
 
 
 class TracingMetrics:
@@ -165,8 +210,29 @@ class TracingMetrics:
     Coletor de métricas para logging local (quando LangSmith não disponível).
     """
     
+    __slots__ = (
+        "metrics",
+        "_llm_count",
+        "_llm_success",
+        "_llm_latency_sum",
+        "_llm_tokens",
+        "_rag_count",
+        "_rag_latency_sum",
+    )
+    
+    # Últimas métricas mantidas em memória (resumo usa contadores acumulados)
+    MAX_STORED_METRICS = 10_000
+    
     def __init__(self):
-        self.metrics = []
+        self.metrics = deque(maxlen=self.MAX_STORED_METRICS)
+        
+        # Contadores incrementais: get_summary em O(1), sem varrer self.metrics
+        self._llm_count = 0
+        self._llm_success = 0
+        self._llm_latency_sum = 0.0
+        self._llm_tokens = 0
+        self._rag_count = 0
+        self._rag_latency_sum = 0.0
     
     def log_llm_call(
         self,
@@ -178,29 +244,35 @@ class TracingMetrics:
         error: Optional[str] = None
     ):
         """Loga métricas de chamada LLM."""
-        metric = {
-            "type": "llm_call",
-            "model": model,
-            "prompt_tokens": prompt_tokens,
-            "completion_tokens": completion_tokens,
-            "total_tokens": prompt_tokens + completion_tokens,
-            "latency_ms": latency_ms,
-            "success": success,
-            "error": error,
-            "timestamp": time.time()
-        }
-        self.metrics.append(metric)
+        total_tokens = prompt_tokens + completion_tokens
+        self.metrics.append(LLMMetric(
+            model, prompt_tokens, completion_tokens, latency_ms, success, error, time.time()
+        ))
         
-        # Log estruturado
+        self._llm_count += 1
+        self._llm_success += 1 if success else 0
+        self._llm_latency_sum += latency_ms
+        self._llm_tokens += total_tokens
+        
+        # Log estruturado: campos nomeados vão para record["extra"] e a mensagem
+        # só é formatada se algum sink aceitar o nível
         if success:
             logger.info(
-                f"[LLM_METRICS] {model} | "
-                f"Tokens: {prompt_tokens}+{completion_tokens}={prompt_tokens + completion_tokens} | "
-                f"Latência: {latency_ms:.0f}ms"
+                "[LLM_METRICS] {model} | "
+                "Tokens: {prompt_tokens}+{completion_tokens}={total_tokens} | "
+                "Latência: {latency_ms:.0f}ms",
+                model=model,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=total_tokens,
+                latency_ms=latency_ms
             )
         else:
             logger.warning(
-                f"[LLM_METRICS] {model} | ERRO: {error} | Latência: {latency_ms:.0f}ms"
+                "[LLM_METRICS] {model} | ERRO: {error} | Latência: {latency_ms:.0f}ms",
+                model=model,
+                error=error,
+                latency_ms=latency_ms
             )
     
     def log_rag_search(
@@ -212,39 +284,39 @@ class TracingMetrics:
         search_type: str = "vector"
     ):
         """Loga métricas de busca RAG."""
-        metric = {
-            "type": "rag_search",
-            "query_length": len(query),
-            "num_results": num_results,
-            "top_similarity": top_similarity,
-            "latency_ms": latency_ms,
-            "search_type": search_type,
-            "timestamp": time.time()
-        }
-        self.metrics.append(metric)
+        self.metrics.append(RAGMetric(
+            len(query), num_results, top_similarity, latency_ms, search_type, time.time()
+        ))
+        
+        self._rag_count += 1
+        self._rag_latency_sum += latency_ms
         
         logger.info(
-            f"[RAG_METRICS] {search_type} | "
-            f"Resultados: {num_results} | "
-            f"Top sim: {top_similarity:.3f} | "
-            f"Latência: {latency_ms:.0f}ms"
+            "[RAG_METRICS] {search_type} | "
+            "Resultados: {num_results} | "
+            "Top sim: {top_similarity:.3f} | "
+            "Latência: {latency_ms:.0f}ms",
+            search_type=search_type,
+            num_results=num_results,
+            top_similarity=top_similarity,
+            latency_ms=latency_ms
         )
     
     def get_summary(self) -> Dict[str, Any]:
         """Retorna resumo das métricas coletadas."""
-        if not self.metrics:
+        if not self._llm_count and not self._rag_count:
             return {}
         
-        llm_calls = [m for m in self.metrics if m["type"] == "llm_call"]
-        rag_searches = [m for m in self.metrics if m["type"] == "rag_search"]
+        llm_count = self._llm_count
+        rag_count = self._rag_count
         
         return {
-            "total_llm_calls": len(llm_calls),
-            "total_rag_searches": len(rag_searches),
-            "avg_llm_latency_ms": sum(m["latency_ms"] for m in llm_calls) / len(llm_calls) if llm_calls else 0,
-            "avg_rag_latency_ms": sum(m["latency_ms"] for m in rag_searches) / len(rag_searches) if rag_searches else 0,
-            "total_tokens": sum(m.get("total_tokens", 0) for m in llm_calls),
-            "llm_success_rate": sum(1 for m in llm_calls if m["success"]) / len(llm_calls) if llm_calls else 1.0
+            "total_llm_calls": llm_count,
+            "total_rag_searches": rag_count,
+            "avg_llm_latency_ms": self._llm_latency_sum / llm_count if llm_count else 0,
+            "avg_rag_latency_ms": self._rag_latency_sum / rag_count if rag_count else 0,
+            "total_tokens": self._llm_tokens,
+            "llm_success_rate": self._llm_success / llm_count if llm_count else 1.0
         }
 
 
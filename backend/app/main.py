@@ -4,97 +4,312 @@ FastAPI application principal.
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
+from fastapi.responses import JSONResponse, Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from loguru import logger
+from contextlib import asynccontextmanager
+from typing import Optional
+from pathlib import Path
+import atexit
+import importlib
+import os
+import queue
+import sys
+import threading
 import time
+import traceback
+from slowapi import _rate_limit_exceeded_handler
 from app.config import get_settings
 from app.middleware.request_id import RequestIDMiddleware, get_request_id
 from app.middleware.rate_limiter import setup_rate_limiting
 from slowapi.errors import RateLimitExceeded
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 settings = get_settings()
 
 
+if ORJSON_AVAILABLE:
+    class ORJSONResponse(JSONResponse):
+        """JSONResponse serializada com orjson (bytes direto, sem json.dumps + encode)."""
+        
+        def render(self, content) -> bytes:
+            # Mesmas opções do ORJSONResponse do FastAPI: chaves não-str e tipos NumPy
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+else:
+    # Sem orjson: resposta JSON padrão do Starlette
+    ORJSONResponse = JSONResponse
+
+
 # Configurar logging
 logger.remove()  # Remover handler padrão
 
-# Adicionar handler para stdout (Console) - ESSENCIAL PARA RENDER/VERCEL
-import sys
-logger.add(
-    sys.stdout,
-    level=settings.log_level,
-    format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <level>{message}</level>",
-    enqueue=True
-)
-
-# Sink customizado para logging em arquivo com rotation
-from pathlib import Path
-import os
+# Um único sink (log_sink) formata cada registro uma vez; a thread de escrita
+# envia a mesma linha para stdout (ESSENCIAL PARA RENDER/VERCEL) e para o arquivo
 
-# Criar diretório de logs se não existir
-log_dir = Path("logs")
-log_dir.mkdir(exist_ok=True)
+# Diretório de logs configurável (LOG_DIR). Em ambientes com disco somente
+# leitura (serverless) o log em arquivo é desativado em vez de quebrar o import
+log_dir = Path(os.getenv("LOG_DIR", "logs"))
 log_file = log_dir / "app.log"
 
+# Escrita em arquivo fora do caminho da requisição: log_sink só enfileira e uma
+# thread dedicada grava em lotes. Fila limitada: em rajadas, descarta em vez de
+# crescer sem limite (a fila interna do loguru com enqueue=True não tem limite)
+_LOG_BUFFER_SIZE = 64 * 1024
+_LOG_FLUSH_INTERVAL_SECONDS = 1.0
+_LOG_QUEUE_MAXSIZE = 20_000
+_LOG_BATCH_SIZE = 256
+_log_queue: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=_LOG_QUEUE_MAXSIZE)
+_log_dropped = 0
+# Descartes (fila cheia) são somados e relatados em WARNING a cada intervalo
+_LOG_DROP_REPORT_INTERVAL_SECONDS = 60.0
+# Destinos ("stdout"/"arquivo") cuja falha de escrita já foi avisada no stderr
+_log_write_failures = set()
+
+
+def _report_write_failure(target: str, exc: Exception):
+    """Avisa no stderr (uma vez por destino) que a escrita de log falhou."""
+    if target in _log_write_failures:
+        return
+    _log_write_failures.add(target)
+    try:
+        sys.__stderr__.write(f"Falha ao gravar log em {target}: {exc!r}\n")
+    except Exception:
+        pass
+
+
+def _write_batch(text: str, fh):
+    """Grava um lote em stdout e no arquivo; a falha de um destino não afeta o outro."""
+    try:
+        sys.stdout.write(text)
+        sys.stdout.flush()
+    except Exception as e:  # ex: pipe fechado
+        _report_write_failure("stdout", e)
+    if fh is not None:
+        try:
+            fh.write(text.encode("utf-8"))
+        except Exception as e:
+            _report_write_failure("arquivo", e)
+
+
+def _flush_log_file(fh):
+    if fh is None:
+        return
+    try:
+        fh.flush()
+    except Exception as e:
+        _report_write_failure("arquivo", e)
+
+
+def _log_writer(fh):
+    """
+    Consome a fila e grava lotes em stdout e no arquivo (único dono do file handle).
+    
+    Erros de escrita não encerram a thread: sem ela, todo registro seguinte
+    encheria a fila e seria descartado em silêncio.
+    
+    Args:
+        fh: Arquivo binário de log, ou None se o log em arquivo estiver desativado
+    """
+    try:
+        last_flush = time.monotonic()
+        last_drop_report = last_flush
+        reported_dropped = 0
+        while True:
+            now = time.monotonic()
+            if now - last_drop_report >= _LOG_DROP_REPORT_INTERVAL_SECONDS:
+                dropped = _log_dropped
+                if dropped > reported_dropped:
+                    logger.warning(
+                        "⚠️ {} registros de log descartados (fila cheia) nos últimos {:.0f}s",
+                        dropped - reported_dropped, now - last_drop_report
+                    )
+                    reported_dropped = dropped
+                last_drop_report = now
+            
+            try:
+                item = _log_queue.get(timeout=_LOG_FLUSH_INTERVAL_SECONDS)
+            except queue.Empty:
+                _flush_log_file(fh)
+                last_flush = time.monotonic()
+                continue
+            
+            batch = []
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= _LOG_BATCH_SIZE:
+                    break
+                try:
+                    item = _log_queue.get_nowait()
+                except queue.Empty:
+                    break
+            
+            if batch:
+                _write_batch("".join(batch), fh)
+            if item is None:
+                # Sentinela de encerramento (atexit)
+                return
+            # Em caso de crash perde-se no máximo ~1s de log
+            if time.monotonic() - last_flush >= _LOG_FLUSH_INTERVAL_SECONDS:
+                _flush_log_file(fh)
+                last_flush = time.monotonic()
+    finally:
+        if fh is not None:
+            try:
+                fh.close()
+            except Exception as e:
+                _report_write_failure("arquivo", e)
+
+
+def _stop_log_writer():
+    """Grava o que restou na fila e fecha o arquivo."""
+    try:
+        _log_queue.put(None, timeout=_LOG_FLUSH_INTERVAL_SECONDS)
+    except queue.Full:
+        return
+    _log_writer_thread.join(timeout=5)
+
+
+# Partes fixas da linha de log pré-formatadas (poucos níveis, muitos registros)
+_LEVEL_STR = {
+    name: name.ljust(8)
+    for name in ("TRACE", "DEBUG", "INFO", "SUCCESS", "WARNING", "ERROR", "CRITICAL")
+}
+_NO_REQUEST_ID = "[--------]"
+
+# Último segundo formatado: (epoch em segundos, "YYYY-MM-DD HH:MM:SS").
+# Reatribuído como tupla (atômico entre threads), strftime uma vez por segundo
+_ts_cache = (0, "")
+
+
 def log_sink(message):
-    """Sink customizado que processa logs diretamente para arquivo."""
+    """Sink customizado: formata a linha uma vez e enfileira para stdout + arquivo."""
+    global _ts_cache, _log_dropped
     record = message.record
     request_id = get_request_id()
-    request_id_str = f"[{request_id}]" if request_id else "[--------]"
-    time_str = record["time"].strftime("%Y-%m-%d %H:%M:%S")
-    level_str = record["level"].name.ljust(8)
-    log_message = str(message)
+    request_id_str = f"[{request_id}]".ljust(10) if request_id else _NO_REQUEST_ID
+    
+    record_time = record["time"]
+    second = int(record_time.timestamp())
+    cached_second, time_str = _ts_cache
+    if second != cached_second:
+        time_str = record_time.strftime("%Y-%m-%d %H:%M:%S")
+        _ts_cache = (second, time_str)
     
-    exception_str = ""
-    if record["exception"]:
-        exception_str = f"\n{record['exception']}"
+    level_name = record["level"].name
+    level_str = _LEVEL_STR.get(level_name) or level_name.ljust(8)
     
-    formatted = f"{time_str} | {level_str} | {request_id_str: <10} | {log_message}{exception_str}\n"
+    # `message` já termina em "\n" e inclui o traceback quando há exceção
+    formatted = f"{time_str} | {level_str} | {request_id_str} | {message}"
     
     try:
-        with open(log_file, "a", encoding="utf-8") as f:
-            f.write(formatted)
-    except Exception:
-        pass
+        _log_queue.put_nowait(formatted)
+    except queue.Full:
+        _log_dropped += 1
 
-# Adicionar sink de arquivo
+# Arquivo de log (se o diretório de logs for gravável)
+_log_file_error = None
+try:
+    log_dir.mkdir(parents=True, exist_ok=True)
+    _log_fh = open(log_file, "ab", buffering=_LOG_BUFFER_SIZE)
+except OSError as log_dir_err:
+    _log_fh = None
+    _log_file_error = log_dir_err
+
+_log_writer_thread = threading.Thread(
+    target=_log_writer, args=(_log_fh,), name="log-writer", daemon=True
+)
+_log_writer_thread.start()
+atexit.register(_stop_log_writer)
+
+# Sem enqueue=True: o enfileiramento (limitado) é feito pelo próprio log_sink
 logger.add(
     log_sink,
     level=settings.log_level,
     format="{message}",
 )
 
+if _log_file_error is not None:
+    logger.warning("Log em arquivo desativado ({}): {}", log_file, _log_file_error)
+
+
+# Ciclo de vida da aplicação (substitui @app.on_event("startup"), obsoleto)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Ciclo de vida simplificado para deploy rápido.
+    Os modelos serão carregados sob demanda (lazy loading).
+    """
+    logger.info("🚀 Servidor pronto para receber requisições (Modo Cloud)")
+    logger.info("✨ TREQ BACKEND VIVO E OPERACIONAL")
+    yield
+
+
 app = FastAPI(
     title=settings.app_name,
     version="1.0.0",
     debug=False,  # Sempre False para não usar handler padrão do Starlette que expõe tracebacks
+    lifespan=lifespan,
+    # Classe concreta, não Default(...): a resolução do FastAPI escolhe o primeiro
+    # valor que não é placeholder, e o Default(JSONResponse) de cada rota venceria
+    default_response_class=ORJSONResponse,
 )
 
+# Corpos de erro constantes serializados uma vez. Cada erro ainda recebe um
+# Response novo: middlewares (ex: CORS) alteram a lista de headers da resposta
+_ERROR_500_BODY = ORJSONResponse(
+    {"detail": "Erro interno ao processar sua solicitação. Por favor, tente novamente."}
+).body
+_ERROR_422_BODY = ORJSONResponse({"detail": "Erro de validação nos dados fornecidos."}).body
+
+
 # Request ID Middleware (deve ser o primeiro para garantir request_id disponível nos logs)
 app.add_middleware(RequestIDMiddleware)
 
 # Exception Handling Middleware (captura exceções de todos os middlewares seguintes)
-class ExceptionHandlingMiddleware(BaseHTTPMiddleware):
-    """Middleware para capturar todas as exceções e retornar mensagens genéricas."""
+class ExceptionHandlingMiddleware:
+    """
+    Middleware para capturar todas as exceções e retornar mensagens genéricas.
     
-    async def dispatch(self, request: Request, call_next):
+    ASGI puro (sem BaseHTTPMiddleware): envolve a aplicação num try/except sem
+    task group nem stream intermediário por requisição.
+    """
+    
+    def __init__(self, app: ASGIApp):
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        response_started = False
+        
+        async def send_tracking_start(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+        
         try:
-            response = await call_next(request)
-            return response
+            await self.app(scope, receive, send_tracking_start)
         except (HTTPException, RateLimitExceeded):
             # Re-raise HTTPException e RateLimitExceeded para que FastAPI trate corretamente (não capturar)
             raise
         except Exception as exc:
-            import traceback
-            logger.error(f"Erro capturado pelo middleware: {exc}")
+            logger.error("Erro capturado pelo middleware: {}", exc)
             logger.error(traceback.format_exc())
             
-            return JSONResponse(
-                status_code=500,
-                content={"detail": "Erro interno ao processar sua solicitação. Por favor, tente novamente."}
-            )
+            # Resposta já começou a ser enviada (ex: streaming): não há como trocar o status
+            if response_started:
+                raise
+            
+            response = Response(_ERROR_500_BODY, status_code=500, media_type="application/json")
+            await response(scope, receive, send)
 
 # Adicionar exception handling middleware (último adicionado = primeiro na cadeia de execução)
 app.add_middleware(ExceptionHandlingMiddleware)
@@ -125,60 +340,28 @@ if "*" in allowed_origins and True: # settings.allow_credentials
     # ou deixamos o FastAPI tratar (ele vai dar erro se não filtrarmos).
     allowed_origins = [o for o in allowed_origins if o != "*"]
 
+# Métodos e headers explícitos (a API só expõe GET/POST; o frontend envia
+# Content-Type e, opcionalmente, Authorization): a resposta de preflight é
+# montada uma vez na inicialização, sem ecoar o que o navegador pediu
+CORS_ALLOW_METHODS = ["GET", "POST", "OPTIONS"]
+CORS_ALLOW_HEADERS = ["Authorization", "Content-Type", "X-Request-ID"]
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins if allowed_origins else ["*"],
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=CORS_ALLOW_METHODS,
+    allow_headers=CORS_ALLOW_HEADERS,
 )
 
 
-# Startup Event - Pré-carregar modelo de embedding
-@app.on_event("startup")
-async def startup_event():
-    """
-    Startup event simplificado para deploy rápido.
-    Os modelos serão carregados sob demanda (lazy loading).
-    """
-    logger.info("🚀 Servidor pronto para receber requisições (Modo Cloud)")
-
-
 # Exception Handlers Globais (DEVE SER ANTES DOS ROUTERS)
 @app.exception_handler(RateLimitExceeded)
 async def rate_limit_exceeded_handler(request, exc: RateLimitExceeded):
     """
     Handler para RateLimitExceeded - retorna status 429.
     """
-    from slowapi import _rate_limit_exceeded_handler
-    return await _rate_limit_exceeded_handler(request, exc)
-
-
-@app.exception_handler(HTTPException)
-async def http_exception_handler(request, exc: HTTPException):
-    """
-    Handler para HTTPException - permite que HTTPExceptions passem normalmente.
-    """
-    return JSONResponse(
-        status_code=exc.status_code,
-        content={"detail": exc.detail}
-    )
-
-
-@app.exception_handler(Exception)
-async def global_exception_handler(request, exc):
-    """
-    Handler global para não expor tracebacks mesmo em modo debug.
-    Garante que mensagens de erro sejam genéricas para o cliente.
-    """
-    import traceback
-    logger.error(f"Erro não tratado: {exc}")
-    logger.error(traceback.format_exc())
-    
-    return JSONResponse(
-        status_code=500,
-        content={"detail": "Erro interno ao processar sua solicitação. Por favor, tente novamente."}
-    )
+    return _rate_limit_exceeded_handler(request, exc)
 
 
 @app.exception_handler(RequestValidationError)
@@ -187,11 +370,9 @@ async def validation_exception_handler(request, exc):
     Handler para erros de validação do Pydantic.
     Retorna mensagem genérica sem expor detalhes dos campos inválidos.
     """
-    logger.warning(f"Erro de validação: {exc}")
-    return JSONResponse(
-        status_code=422,
-        content={"detail": "Erro de validação nos dados fornecidos."}
-    )
+    # Formatação adiada: str(exc) só é montado se o nível WARNING estiver ativo
+    logger.warning("Erro de validação: {}", exc)
+    return Response(_ERROR_422_BODY, status_code=422, media_type="application/json")
 
 
 # Saúde do servidor
@@ -208,68 +389,32 @@ async def list_routes():
     return [{"path": route.path, "name": route.name} for route in app.routes]
 
 # INCLUIR ROTAS (Agora são leves devido ao lazy loading nos routes)
-logger.info("📦 Iniciando registro individual de rotas...")
-
-# CHAT
-try:
-    from app.api.routes import chat
-    app.include_router(chat.router)
-    logger.info("✅ Router chat incluído")
-except Exception as e:
-    logger.error(f"❌ Falha ao incluir router CHAT: {e}")
-
-# HEALTH (Serviços LLM)
-try:
-    from app.api.routes import health as health_route
-    app.include_router(health_route.router)
-    logger.info("✅ Router health incluído")
-except Exception as e:
-    logger.error(f"❌ Falha ao incluir router HEALTH: {e}")
-
-# MONITORING
-try:
-    from app.api.routes import monitoring
-    app.include_router(monitoring.router)
-    logger.info("✅ Router monitoring incluído")
-except Exception as e:
-    logger.error(f"❌ Falha ao incluir router MONITORING: {e}")
-
-# FEEDBACK
-try:
-    from app.api.routes import feedback
-    app.include_router(feedback.router)
-    logger.info("✅ Router feedback incluído")
-except Exception as e:
-    logger.error(f"❌ Falha ao incluir router FEEDBACK: {e}")
-
-# AUDIO
-try:
-    from app.api.routes import audio
-    app.include_router(audio.router)
-    logger.info("✅ Router audio incluído")
-except Exception as e:
-    logger.error(f"❌ Falha ao incluir router AUDIO: {e}")
+# Um único log de resumo no fim, em vez de uma linha por router.
+# Importação sequencial de propósito: o chat responde por quase todo o tempo
+# (dependências compartilhadas), então threads só disputariam o import lock
+_ROUTER_MODULES = (
+    ("chat", "app.api.routes.chat"),
+    ("health", "app.api.routes.health"),  # Serviços LLM
+    ("monitoring", "app.api.routes.monitoring"),
+    ("feedback", "app.api.routes.feedback"),
+    ("audio", "app.api.routes.audio"),
+    ("documents", "app.api.routes.documents"),
+)
+_included_routers = []
 
-# DOCUMENTS
-try:
-    from app.api.routes import documents
-    app.include_router(documents.router)
-    logger.info("✅ Router documents incluído")
-except Exception as e:
-    logger.error(f"❌ Falha ao incluir router DOCUMENTS: {e}")
+for _router_name, _module_path in _ROUTER_MODULES:
+    try:
+        app.include_router(importlib.import_module(_module_path).router)
+        _included_routers.append(_router_name)
+    except Exception as e:
+        logger.error("❌ Falha ao incluir router {}: {}", _router_name.upper(), e)
 
 # VISION (Feature Modular)
 try:
     from src.features.vision.routes import router as vision_router
     app.include_router(vision_router)
-    logger.info("✅ Router vision incluído")
+    _included_routers.append("vision")
 except Exception as vision_err:
-    logger.warning(f"⚠️ Router vision opcional não incluído: {vision_err}")
+    logger.warning("⚠️ Router vision opcional não incluído: {}", vision_err)
 
-logger.info("🚀 Processo de registro de rotas concluído")
-
-# Startup Final
-@app.on_event("startup")
-async def startup_event():
-    logger.info("🚀 Servidor Pronto! (Modo Cloud)")
-    logger.info("✨ TREQ BACKEND VIVO E OPERACIONAL")
+logger.info("✅ Routers incluídos: {}", ", ".join(_included_routers))
@@ -2,10 +2,17 @@
 Middleware de Rate Limiting para proteção contra abuso de API.
 Usa slowapi para limitar requisições por endpoint.
 """
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Callable, Deque, Dict
+
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.middleware import SlowAPIMiddleware
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+from slowapi.wrappers import Limit
+from limits import parse_many
 from fastapi import Request
 from loguru import logger
 from app.config import get_settings
@@ -20,6 +27,73 @@ limiter = Limiter(
     strategy="fixed-window"  # Janela fixa de 1 minuto
 )
 
+class SlidingWindowCounter:
+    """
+    Contador de janela deslizante em memória (por processo).
+    
+    Um deque de timestamps por chave, tudo sob um único lock: a verificação é
+    um popleft dos expirados + len + append, sem o storage genérico do `limits`.
+    Adequado para um único processo (deploy atual: um worker uvicorn); com
+    vários workers cada processo conta separadamente.
+    """
+    
+    # A cada N hits, chaves inativas são removidas (evita crescer com IPs antigos)
+    SWEEP_EVERY = 1024
+    
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._hits: Dict[str, Deque[float]] = defaultdict(deque)
+        self._lock = threading.Lock()
+        self._max_window = 0.0
+        self._hits_since_sweep = 0
+    
+    def hit(self, key: str, amount: int, window_seconds: float) -> bool:
+        """
+        Registra um hit para `key` se houver espaço na janela.
+        
+        Args:
+            key: Identificador (ex: "ip:endpoint")
+            amount: Máximo de hits permitidos na janela
+            window_seconds: Tamanho da janela em segundos
+        
+        Returns:
+            True se o hit foi aceito, False se o limite foi excedido
+        """
+        now = self._clock()
+        cutoff = now - window_seconds
+        with self._lock:
+            hits = self._hits[key]
+            while hits and hits[0] <= cutoff:
+                hits.popleft()
+            
+            if len(hits) >= amount:
+                return False
+            hits.append(now)
+            
+            if window_seconds > self._max_window:
+                self._max_window = window_seconds
+            self._hits_since_sweep += 1
+            if self._hits_since_sweep >= self.SWEEP_EVERY:
+                self._sweep(now)
+            return True
+    
+    def _sweep(self, now: float) -> None:
+        """Remove chaves sem hits dentro da maior janela vista (chamado com lock)."""
+        stale_before = now - self._max_window
+        for key in [k for k, hits in self._hits.items() if not hits or hits[-1] <= stale_before]:
+            del self._hits[key]
+        self._hits_since_sweep = 0
+    
+    def reset(self) -> None:
+        """Zera todos os contadores."""
+        with self._lock:
+            self._hits.clear()
+            self._hits_since_sweep = 0
+
+
+# Contador usado pela dependência rate_limit()
+sliding_window = SlidingWindowCounter()
+
 # Configurações de rate limit por tipo de endpoint
 RATE_LIMITS = {
     "chat": "30/minute",  # Endpoint de chat (considerando streaming e custo de LLM)
@@ -101,47 +175,41 @@ def rate_limit(limit_value: str):
         ):
             ...
     """
+    # Limites interpretados uma única vez, na criação da dependência
+    # (antes: LimitGroup + parse da string a cada requisição). Cada limite conta
+    # num deque próprio: com um deque compartilhado, o popleft da janela mais
+    # curta apagaria o histórico que a mais longa precisa ("5/second;100/minute")
+    limits = [
+        (
+            Limit(item, get_remote_address, None, False, None, None, None, 1, True),
+            f":{item.amount}/{item.get_expiry()}",
+            item.amount,
+            item.get_expiry(),
+        )
+        for item in parse_many(limit_value)
+    ]
+    
     async def limit_dependency(request: Request):
         """
         Dependency que verifica rate limit antes de executar o endpoint.
         
-        Usa o limiter do app.state para verificar limites e lança
+        Conta os hits no SlidingWindowCounter do módulo e lança
         RateLimitExceeded se o limite for excedido.
         """
-        # Obter limiter do app.state (garantido pela configuração)
+        # Rate limiting só ativo com setup_rate_limiting (app.state.limiter)
         if not hasattr(request.app.state, 'limiter'):
             logger.warning("app.state.limiter não encontrado - rate limiting desabilitado")
             return
         
-        app_limiter = request.app.state.limiter
-        
-        # Obter endpoint name para identificar a rota
-        endpoint_name = f"{request.url.path}:{request.method.lower()}"
-        
-        # Obter chave de identificação (IP ou outro identificador)
-        key = get_remote_address(request)
-        
-        # Criar LimitGroup como o decorator faz internamente
-        from slowapi.wrappers import LimitGroup
-        
-        limit_group = LimitGroup(
-            limit_value,
-            get_remote_address,
-            None,  # scope
-            False,  # per_method
-            None,  # methods
-            None,  # error_message
-            None,  # exempt_when
-            1,  # cost
-            True  # override_defaults
-        )
-        
-        # Obter limites do grupo
-        limit_group.request = request
-        limits = list(limit_group)
+        # Chave: IP + rota + método
+        key = f"{get_remote_address(request)}:{request.url.path}:{request.method.lower()}"
         
-        # Avaliar limites usando o método interno do limiter
-        app_limiter._Limiter__evaluate_limits(request, endpoint_name, limits)
+        for limit, key_suffix, amount, window_seconds in limits:
+            if not sliding_window.hit(key + key_suffix, amount, window_seconds):
+                logger.warning("Rate limit {} excedido para {}", limit.limit, key)
+                # Lido pelo handler de 429 do slowapi (sem headers de limite)
+                request.state.view_rate_limit = None
+                raise RateLimitExceeded(limit)
         
         # Se chegou aqui, rate limit não foi excedido
     
@@ -2,11 +2,12 @@
 Middleware para geração e propagação de Request ID.
 Facilita rastreamento de requisições através de logs.
 """
-import uuid
+import os
 from contextvars import ContextVar
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Nome do header já em bytes minúsculos (forma ASGI), sem normalizar por requisição
+_REQUEST_ID_HEADER = b"x-request-id"
 
 # Context variable para armazenar request_id
 request_id_var: ContextVar[str] = ContextVar("request_id", default="")
@@ -17,26 +18,43 @@ def get_request_id() -> str:
     return request_id_var.get("")
 
 
-class RequestIDMiddleware(BaseHTTPMiddleware):
+class RequestIDMiddleware:
     """
     Middleware que gera um request_id único para cada requisição HTTP.
     Propaga o request_id através de contextvars para uso em toda a aplicação.
+
+    ASGI puro (sem BaseHTTPMiddleware): sem task group nem stream extra por
+    requisição, só o header injetado no http.response.start.
     """
-    
-    async def dispatch(self, request: Request, call_next):
-        # Gerar request_id único (8 caracteres do UUID)
-        request_id = str(uuid.uuid4())[:8]
-        
-        # Armazenar no contexto
-        request_id_var.set(request_id)
-        
-        # Adicionar ao request state para acesso em rotas
-        request.state.request_id = request_id
-        
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Gerar request_id (8 caracteres hex, 32 bits aleatórios - mesmo formato de antes,
+        # sem montar um UUID de 128 bits para descartar 3/4 dele)
+        request_id = os.urandom(4).hex()
+
+        # Armazenar no contexto (restaurado ao fim da requisição)
+        token = request_id_var.set(request_id)
+
+        # Adicionar ao request state para acesso em rotas (request.state.request_id)
+        scope.setdefault("state", {})["request_id"] = request_id
+
+        async def send_with_request_id(message: Message):
+            # Adicionar request_id no header de resposta
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((_REQUEST_ID_HEADER, request_id.encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
         # Processar requisição
-        response = await call_next(request)
-        
-        # Adicionar request_id no header de resposta
-        response.headers["X-Request-ID"] = request_id
-        
-        return response
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
@@ -3,7 +3,7 @@ Serviço para converter documentos (PDF/Excel/DOCX/PPTX/Imagens) para Markdown.
 MVP 100% FREE: Usa apenas soluções leves e gratuitas.
 
 - PDF (texto nativo): PyPDF2/pdfplumber - Extrai texto de PDFs com texto nativo
-- Excel: pandas/openpyxl - Conversão completa de planilhas
+- Excel: python-calamine (ou openpyxl) - Conversão completa de planilhas
 - DOCX: python-docx - Conversão preservando estrutura
 - PPTX: python-pptx - Conversão com estrutura de slides
 - PDF (escaneado/OCR): Suporte básico via OCR Service (opcional)
@@ -14,13 +14,21 @@ LIMITAÇÕES:
 - PDFs com imagens não extraem texto das imagens automaticamente
 - Imagens requerem OCR (biblioteca opcional)
 """
-from typing import Optional
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor
+from functools import lru_cache, partial
+from typing import AsyncIterator, Callable, Dict, Iterable, Optional, Tuple, Union
 from pathlib import Path
 from io import BytesIO
+from cachetools import LRUCache
 from loguru import logger
+import asyncio
+import hashlib
+import importlib.util
+import multiprocessing
+import os
 import re
 
-from app.services.pdf_converter import convert_pdf_to_markdown
+from app.services.pdf_converter import convert_pdf_to_markdown, looks_like_pdf
 from app.services.excel_converter import convert_excel_to_markdown
 
 # Importar OCR Service (opcional)
@@ -39,46 +47,100 @@ except ImportError:
     VISION_AVAILABLE = False
     multimodal_service = None
 
-# Verificar disponibilidade de bibliotecas
-try:
-    import PyPDF2
-    PYPDF2_AVAILABLE = True
-except ImportError:
-    PYPDF2_AVAILABLE = False
+# Verificar disponibilidade de bibliotecas (sem importar: cada uma é carregada
+# na primeira conversão do formato correspondente)
+PYPDF2_AVAILABLE = importlib.util.find_spec("PyPDF2") is not None
+if not PYPDF2_AVAILABLE:
     logger.warning("PyPDF2 não instalado. PDF não será suportado.")
 
-try:
-    EXCEL_AVAILABLE = True
-    import pandas as pd
-except ImportError:
-    EXCEL_AVAILABLE = False
-    logger.warning("pandas/openpyxl não instalados. Excel não será suportado.")
+EXCEL_AVAILABLE = (
+    importlib.util.find_spec("python_calamine") is not None
+    or importlib.util.find_spec("openpyxl") is not None
+)
+if not EXCEL_AVAILABLE:
+    logger.warning("python-calamine/openpyxl não instalados. Excel não será suportado.")
 
-try:
-    from docx import Document
-    DOCX_AVAILABLE = True
-except ImportError:
-    DOCX_AVAILABLE = False
+DOCX_AVAILABLE = importlib.util.find_spec("docx") is not None
+if not DOCX_AVAILABLE:
     logger.warning("python-docx não instalado. DOCX não será suportado.")
 
-try:
-    from pptx import Presentation
-    PPTX_AVAILABLE = True
-except ImportError:
-    PPTX_AVAILABLE = False
+PPTX_AVAILABLE = importlib.util.find_spec("pptx") is not None
+if not PPTX_AVAILABLE:
     logger.warning("python-pptx não instalado. PPTX não será suportado.")
 
 
+# Limite do cache de conversões, em caracteres de Markdown (não em entradas:
+# um PDF grande pesa mais que dezenas de uploads pequenos)
+_RESULT_CACHE_MAX_CHARS = 64 * 1024 * 1024
+
+# TREQ_DOC_CACHE=0 desliga o cache de conversões (ex.: depuração dos conversores)
+_RESULT_CACHE_ENABLED = os.getenv("TREQ_DOC_CACHE", "1") != "0"
+
+_EXCEL_SUFFIXES = (".xlsx", ".xls")
+_IMAGE_SUFFIXES = (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".tif", ".webp")
+
+# Conteúdo de upload (bytes) ou arquivo em disco (convert_file)
+DocumentSource = Union[bytes, Path]
+
+
+_HEADING_RE = re.compile(r'heading\s*(\d+)')
+
+
+def _heading_level(style_name: str) -> Optional[int]:
+    """Nível de cabeçalho Markdown do estilo de parágrafo do Word (None = texto comum)."""
+    style_name = style_name.lower()
+    if 'heading' not in style_name and 'title' not in style_name:
+        return None
+    # Extrair nível do cabeçalho (Heading 1, Heading 2, etc.)
+    level_match = _HEADING_RE.search(style_name)
+    if level_match:
+        return int(level_match.group(1))
+    if 'title' in style_name:
+        return 1
+    return 2
+
+
+@lru_cache(maxsize=None)
+def _get_document_class():
+    """Importa python-docx sob demanda."""
+    from docx import Document
+    return Document
+
+
+@lru_cache(maxsize=None)
+def _get_presentation_class():
+    """Importa python-pptx sob demanda."""
+    from pptx import Presentation
+    return Presentation
+
+
 class DocumentConverterService:
     """Serviço para converter documentos para Markdown (MVP 100% FREE)."""
     
-    def __init__(self, enable_ocr: bool = False):
+    # Extensão -> (método de conversão, dependência instalada, erro se faltando).
+    # Imagens não têm dependência fixa: Visão/OCR são verificados na conversão
+    _HANDLERS: Dict[str, Tuple[str, bool, str]] = {
+        **dict.fromkeys(_EXCEL_SUFFIXES, ("_convert_excel", EXCEL_AVAILABLE, "Excel não suportado - python-calamine/openpyxl não instalados")),
+        ".pdf": ("_convert_pdf", PYPDF2_AVAILABLE, "PDF não suportado - PyPDF2 não instalado"),
+        ".docx": ("_convert_docx", DOCX_AVAILABLE, "DOCX não suportado - python-docx não instalado"),
+        ".pptx": ("_convert_pptx", PPTX_AVAILABLE, "PPTX não suportado - python-pptx não instalado"),
+        **dict.fromkeys(_IMAGE_SUFFIXES, ("_convert_image", True, "")),
+    }
+    
+    def __init__(self, enable_ocr: bool = False, detect_tables: bool = True):
         """
         Inicializa o conversor de documentos.
         
         Args:
             enable_ocr: Se True, tenta usar OCR para PDFs escaneados (requer bibliotecas)
+            detect_tables: Se False, não procura tabelas em PDFs (acervos só de texto)
         """
+        self.detect_tables = detect_tables
+        
+        # Reenvios do mesmo arquivo (retry, reupload no chat) reaproveitam o
+        # Markdown: chave = hash do conteúdo + nome (o nome entra no título)
+        self._result_cache: LRUCache = LRUCache(maxsize=_RESULT_CACHE_MAX_CHARS, getsizeof=len)
+        
         # Inicializar OCR Service se solicitado e disponível
         self.enable_ocr = enable_ocr and OCR_AVAILABLE
         self.ocr_service = None
@@ -118,7 +180,7 @@ class DocumentConverterService:
         if not PYPDF2_AVAILABLE:
             logger.warning("PDF não disponível - PyPDF2 não instalado")
         if not EXCEL_AVAILABLE:
-            logger.warning("Excel não disponível - pandas/openpyxl não instalados")
+            logger.warning("Excel não disponível - python-calamine/openpyxl não instalados")
         if not DOCX_AVAILABLE:
             logger.warning("DOCX não disponível - python-docx não instalado")
         if not PPTX_AVAILABLE:
@@ -140,30 +202,16 @@ class DocumentConverterService:
             logger.error(f"Arquivo não encontrado: {file_path}")
             return None
         
-        suffix = path.suffix.lower()
-        
-        # Verificar se é Excel
-        if suffix in ['.xlsx', '.xls']:
-            if not EXCEL_AVAILABLE:
-                logger.error("Excel não suportado - pandas/openpyxl não instalados")
-                return None
-            return convert_excel_to_markdown(path.read_bytes(), path.name)
-        
-        # Verificar se é PDF
-        if suffix == '.pdf':
-            if not PYPDF2_AVAILABLE:
-                logger.error("PDF não suportado - PyPDF2 não instalado")
-                return None
-            return convert_pdf_to_markdown(path.read_bytes(), path.name)
-        
-        # Formatos não suportados
-        logger.warning(f"Formato {suffix} não suportado no MVP (apenas PDF texto nativo e Excel)")
-        return None
+        return await self._convert_source(path, path.name)
     
     async def convert_bytes(self, file_content: bytes, filename: str) -> Optional[str]:
         """
         Converte arquivo a partir de bytes (para upload) para Markdown.
         
+        Resultados são mantidos em cache LRU pelo hash do conteúdo; falhas
+        (None) não são guardadas, para que uma nova tentativa reprocesse.
+        Desligado com TREQ_DOC_CACHE=0.
+        
         Args:
             file_content: Conteúdo do arquivo em bytes
             filename: Nome do arquivo (para detectar formato)
@@ -171,60 +219,195 @@ class DocumentConverterService:
         Returns:
             str: Conteúdo Markdown ou None se erro
         """
-        suffix = Path(filename).suffix.lower()
+        return await self._convert_bytes(file_content, filename)
+    
+    async def _convert_bytes(
+        self,
+        file_content: bytes,
+        filename: str,
+        executor: Optional[Executor] = None
+    ) -> Optional[str]:
+        """convert_bytes com executor opcional para os conversores síncronos."""
+        if not _RESULT_CACHE_ENABLED:
+            return await self._convert_source(file_content, filename, executor)
         
-        # Roteamento: Excel usa conversão manual
-        if suffix in ['.xlsx', '.xls']:
-            if not EXCEL_AVAILABLE:
-                logger.error("Excel não suportado - pandas/openpyxl não instalados")
-                return None
-            return convert_excel_to_markdown(file_content, filename)
+        cache_key = (hashlib.blake2b(file_content, digest_size=16).digest(), filename)
+        cached = self._result_cache.get(cache_key)
+        if cached is not None:
+            logger.debug(f"Conversão reaproveitada do cache: {filename}")
+            return cached
         
-        # PDF
-        if suffix == '.pdf':
-            if not PYPDF2_AVAILABLE:
-                logger.error("PDF não suportado - PyPDF2 não instalado")
-                return None
-            
-            # Tentar conversão normal primeiro
-            markdown_content = convert_pdf_to_markdown(file_content, filename)
-            
-            # Se falhou e OCR está habilitado, tentar OCR
-            if not markdown_content and self.enable_ocr and self.ocr_service:
-                logger.info(f"Conversão PDF normal falhou, tentando OCR para: {filename}")
-                markdown_content = self.ocr_service.process_scanned_pdf(file_content, filename)
-            
-            return markdown_content
+        markdown_content = await self._convert_source(file_content, filename, executor)
         
-        # DOCX
-        if suffix == '.docx':
-            if not DOCX_AVAILABLE:
-                logger.error("DOCX não suportado - python-docx não instalado")
-                return None
-            return self.convert_docx_to_markdown(file_content, filename)
+        # Resultados maiores que o cache inteiro não são guardados
+        if markdown_content and len(markdown_content) <= _RESULT_CACHE_MAX_CHARS:
+            self._result_cache[cache_key] = markdown_content
+        return markdown_content
+    
+    def release_document_cache(self) -> None:
+        """Descarta as conversões em cache (libera a memória do Markdown guardado)."""
+        self._result_cache.clear()
+    
+    async def convert_many(
+        self,
+        sources: Iterable[Tuple[bytes, str]],
+        concurrency: int = 4,
+        num_workers: Optional[int] = None
+    ) -> AsyncIterator[Tuple[str, Optional[str]]]:
+        """
+        Converte vários arquivos em paralelo, entregando cada um ao terminar.
         
-        # PPTX
-        if suffix == '.pptx':
-            if not PPTX_AVAILABLE:
-                logger.error("PPTX não suportado - python-pptx não instalado")
-                return None
-            return self.convert_pptx_to_markdown(file_content, filename)
+        Os parsers (pdfminer, openpyxl, python-docx, python-pptx) são Python puro
+        e seguram a GIL: em threads, as conversões do lote se revezam em um núcleo.
+        Com num_workers, PDF/Excel/DOCX/PPTX rodam em um pool de processos criado
+        para o lote; imagens (Visão/OCR, limitadas por rede) seguem no processo.
         
-        # Imagens (JPEG, PNG, GIF, BMP, TIFF, WEBP)
-        if suffix in ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.tif', '.webp']:
-            # Prioridade 1: Visão Multimodal (Gemini)
-            if VISION_AVAILABLE and multimodal_service:
-                return await self.convert_image_via_vision(file_content, filename)
+        Args:
+            sources: Pares (conteúdo em bytes, nome do arquivo)
+            concurrency: Máximo de conversões simultâneas
+            num_workers: Processos para os conversores síncronos (None = threads)
             
-            # Prioridade 2: OCR padrão
-            if not self.enable_ocr or not self.ocr_service:
-                logger.error("Imagens não suportadas - OCR não habilitado e Visão não disponível")
-                return None
-            return self.convert_image_to_markdown(file_content, filename)
+        Yields:
+            Tuple[nome do arquivo, Markdown ou None se erro], em ordem de conclusão
+            (o primeiro documento pronto já pode ser indexado)
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        executor = None
+        if num_workers:
+            # spawn: o processo do servidor tem threads (logs, event loop), fork não é seguro
+            executor = ProcessPoolExecutor(
+                max_workers=num_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_conversion_worker
+            )
         
-        # Formatos não suportados
-        logger.warning(f"Formato {suffix} não suportado")
-        return None
+        async def convert_one(file_content: bytes, filename: str) -> Tuple[str, Optional[str]]:
+            async with semaphore:
+                return filename, await self._convert_bytes(file_content, filename, executor)
+        
+        tasks = [asyncio.create_task(convert_one(content, name)) for content, name in sources]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # Consumidor interrompeu a iteração: não deixar conversões órfãs
+            for task in tasks:
+                task.cancel()
+            if executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+    
+    async def _convert_source(
+        self,
+        source: DocumentSource,
+        filename: str,
+        executor: Optional[Executor] = None
+    ) -> Optional[str]:
+        """
+        Converte bytes ou arquivo em disco para Markdown pelo formato da extensão (sem cache).
+        
+        Conversores síncronos (PDF, Excel, DOCX, PPTX, OCR) rodam em thread para
+        não bloquear o event loop durante o parse, ou no pool de processos
+        `executor` quando informado (OCR e imagens sempre em thread).
+        """
+        suffix = Path(filename).suffix.lower()
+        
+        handler = self._HANDLERS.get(suffix)
+        if handler is None:
+            logger.warning(f"Formato {suffix} não suportado")
+            return None
+        
+        method_name, available, missing_message = handler
+        if not available:
+            logger.error(missing_message)
+            return None
+        return await getattr(self, method_name)(source, filename, executor)
+    
+    @staticmethod
+    async def _read_source(source: DocumentSource) -> bytes:
+        """Conteúdo em bytes da fonte (arquivo em disco lido fora do event loop)."""
+        if isinstance(source, Path):
+            return await asyncio.to_thread(source.read_bytes)
+        return source
+    
+    def _sync_converter(self, kind: str) -> Callable[[DocumentSource, str], Optional[str]]:
+        """Conversor síncrono do formato ("pdf", "excel", "docx" ou "pptx")."""
+        if kind == "pdf":
+            return partial(convert_pdf_to_markdown, detect_tables=self.detect_tables)
+        if kind == "excel":
+            return convert_excel_to_markdown
+        if kind == "docx":
+            return self.convert_docx_to_markdown
+        return self.convert_pptx_to_markdown
+    
+    async def _run_converter(
+        self,
+        executor: Optional[Executor],
+        kind: str,
+        source: DocumentSource,
+        filename: str
+    ) -> Optional[str]:
+        """Roda o conversor síncrono no pool de processos (se houver) ou em thread."""
+        if executor is not None:
+            try:
+                return await asyncio.get_running_loop().run_in_executor(
+                    executor, _convert_in_worker, kind, source, filename, self.detect_tables
+                )
+            except (BrokenExecutor, RuntimeError) as e:
+                # Pool quebrado ou já encerrado: converte neste processo
+                logger.warning(f"Pool de conversão indisponível para '{filename}': {e}")
+        return await asyncio.to_thread(self._sync_converter(kind), source, filename)
+    
+    async def _convert_excel(
+        self, source: DocumentSource, filename: str, executor: Optional[Executor] = None
+    ) -> Optional[str]:
+        # Caminho em disco é passado direto: o leitor abre o ZIP do arquivo,
+        # sem uma cópia completa em bytes
+        return await self._run_converter(executor, "excel", source, filename)
+    
+    async def _convert_pdf(
+        self, source: DocumentSource, filename: str, executor: Optional[Executor] = None
+    ) -> Optional[str]:
+        # Tentar conversão normal primeiro (caminho em disco é passado direto:
+        # o parser lê as páginas sob demanda)
+        markdown_content = await self._run_converter(executor, "pdf", source, filename)
+        
+        # Se falhou e OCR está habilitado, tentar OCR
+        if not markdown_content and self.enable_ocr and self.ocr_service:
+            file_content = await self._read_source(source)
+            # Só se for mesmo um PDF
+            if looks_like_pdf(file_content):
+                logger.info(f"Conversão PDF normal falhou, tentando OCR para: {filename}")
+                markdown_content = await asyncio.to_thread(
+                    self.ocr_service.process_scanned_pdf, file_content, filename
+                )
+        
+        return markdown_content
+    
+    async def _convert_docx(
+        self, source: DocumentSource, filename: str, executor: Optional[Executor] = None
+    ) -> Optional[str]:
+        file_content = await self._read_source(source)
+        return await self._run_converter(executor, "docx", file_content, filename)
+    
+    async def _convert_pptx(
+        self, source: DocumentSource, filename: str, executor: Optional[Executor] = None
+    ) -> Optional[str]:
+        file_content = await self._read_source(source)
+        return await self._run_converter(executor, "pptx", file_content, filename)
+    
+    async def _convert_image(
+        self, source: DocumentSource, filename: str, executor: Optional[Executor] = None
+    ) -> Optional[str]:
+        # Prioridade 1: Visão Multimodal (Gemini)
+        if VISION_AVAILABLE and multimodal_service:
+            return await self.convert_image_via_vision(await self._read_source(source), filename)
+        
+        # Prioridade 2: OCR padrão
+        if not self.enable_ocr or not self.ocr_service:
+            logger.error("Imagens não suportadas - OCR não habilitado e Visão não disponível")
+            return None
+        file_content = await self._read_source(source)
+        return await asyncio.to_thread(self.convert_image_to_markdown, file_content, filename)
     
     def convert_docx_to_markdown(self, file_content: bytes, filename: str) -> Optional[str]:
         """
@@ -242,9 +425,14 @@ class DocumentConverterService:
             return None
         
         try:
-            doc = Document(BytesIO(file_content))
+            doc = _get_document_class()(BytesIO(file_content))
             markdown_lines = []
             
+            # Nível de cabeçalho por id de estilo: para.style resolve o estilo na
+            # tabela de estilos a cada acesso (a etapa mais cara do laço) e um
+            # documento usa poucos estilos
+            style_levels: Dict[Optional[str], Optional[int]] = {}
+            
             # Processar parágrafos
             for para in doc.paragraphs:
                 text = para.text.strip()
@@ -252,17 +440,12 @@ class DocumentConverterService:
                     continue
                 
                 # Detectar cabeçalhos baseado no estilo
-                style_name = para.style.name.lower()
-                if 'heading' in style_name or 'title' in style_name:
-                    # Extrair nível do cabeçalho (Heading 1, Heading 2, etc.)
-                    level_match = re.search(r'heading\s*(\d+)', style_name)
-                    if level_match:
-                        level = int(level_match.group(1))
-                    elif 'title' in style_name:
-                        level = 1
-                    else:
-                        level = 2
-                    
+                style_id = para._p.style
+                if style_id in style_levels:
+                    level = style_levels[style_id]
+                else:
+                    level = style_levels[style_id] = _heading_level(para.style.name)
+                if level is not None:
                     markdown_lines.append(f"{'#' * level} {text}\n")
                 else:
                     markdown_lines.append(f"{text}\n")
@@ -282,9 +465,7 @@ class DocumentConverterService:
             return result
             
         except Exception as e:
-            logger.error(f"Erro ao converter DOCX '{filename}': {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.exception("Erro ao converter DOCX '{}': {}", filename, e)
             return None
     
     def convert_pptx_to_markdown(self, file_content: bytes, filename: str) -> Optional[str]:
@@ -303,7 +484,7 @@ class DocumentConverterService:
             return None
         
         try:
-            prs = Presentation(BytesIO(file_content))
+            prs = _get_presentation_class()(BytesIO(file_content))
             markdown_lines = []
             
             for i, slide in enumerate(prs.slides, 1):
@@ -311,10 +492,13 @@ class DocumentConverterService:
                 
                 # Processar formas na slide
                 for shape in slide.shapes:
-                    if not hasattr(shape, "text"):
+                    # getattr em vez de hasattr + shape.text: hasattr já avalia a
+                    # propriedade, o que extraía o texto de cada forma duas vezes
+                    text = getattr(shape, "text", None)
+                    if text is None:
                         continue
                     
-                    text = shape.text.strip()
+                    text = text.strip()
                     if not text:
                         continue
                     
@@ -341,9 +525,7 @@ class DocumentConverterService:
             return result
             
         except Exception as e:
-            logger.error(f"Erro ao converter PPTX '{filename}': {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.exception("Erro ao converter PPTX '{}': {}", filename, e)
             return None
     
     def convert_image_to_markdown(self, image_bytes: bytes, filename: str) -> Optional[str]:
@@ -372,9 +554,7 @@ class DocumentConverterService:
             return markdown_content
             
         except Exception as e:
-            logger.error(f"Erro ao converter imagem '{filename}': {e}")
-            import traceback
-            logger.error(traceback.format_exc())
+            logger.exception("Erro ao converter imagem '{}': {}", filename, e)
             return None
 
     async def convert_image_via_vision(self, image_bytes: bytes, filename: str) -> Optional[str]:
@@ -444,13 +624,13 @@ class DocumentConverterService:
         except MultimodalQuotaError:
             logger.warning(f"Cota Gemini atingida para {filename}. Usando OCR como fallback.")
             if self.enable_ocr and self.ocr_service:
-                return self.convert_image_to_markdown(image_bytes, filename)
+                return await asyncio.to_thread(self.convert_image_to_markdown, image_bytes, filename)
             return None
         except Exception as e:
             logger.error(f"Erro ao processar imagem via Vision: {e}")
             if self.enable_ocr and self.ocr_service:
                 logger.info("Tentando fallback para OCR tradicional...")
-                return self.convert_image_to_markdown(image_bytes, filename)
+                return await asyncio.to_thread(self.convert_image_to_markdown, image_bytes, filename)
             return None
     
     def _table_to_markdown(self, table) -> str:
@@ -485,3 +665,27 @@ class DocumentConverterService:
         except Exception as e:
             logger.warning(f"Erro ao converter tabela para Markdown: {e}")
             return ""
+
+
+def _init_conversion_worker() -> None:
+    """Inicializa um processo do pool de convert_many."""
+    from app.services import pdf_converter
+    # O processo já é a unidade de paralelismo do lote: um pool de páginas
+    # por PDF dentro dele só disputaria os mesmos núcleos
+    pdf_converter.PDF_MAX_WORKERS = 1
+
+
+@lru_cache(maxsize=None)
+def _get_worker_service(detect_tables: bool) -> DocumentConverterService:
+    """Conversor do processo do pool (criado na primeira tarefa, sem OCR)."""
+    return DocumentConverterService(detect_tables=detect_tables)
+
+
+def _convert_in_worker(
+    kind: str,
+    source: DocumentSource,
+    filename: str,
+    detect_tables: bool
+) -> Optional[str]:
+    """Executa um conversor síncrono em um processo do pool de convert_many."""
+    return _get_worker_service(detect_tables)._sync_converter(kind)(source, filename)
@@ -1,63 +1,236 @@
 """
 Conversor de Excel para Markdown.
 """
-from typing import Optional
+from datetime import date, datetime, time
+from functools import lru_cache
+from numbers import Number
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+import importlib.util
 import io
+import os
 from loguru import logger
 
-try:
-    import pandas as pd
+# Disponibilidade verificada sem importar: o leitor é carregado na primeira
+# planilha convertida. python-calamine (Rust, lê o XML do ZIP em streaming)
+# tem preferência; openpyxl é o fallback
+CALAMINE_AVAILABLE = importlib.util.find_spec("python_calamine") is not None
+OPENPYXL_AVAILABLE = importlib.util.find_spec("openpyxl") is not None
+EXCEL_AVAILABLE = CALAMINE_AVAILABLE or OPENPYXL_AVAILABLE
+
+# Acima deste tamanho a planilha é lida sem os valores em cache das fórmulas
+# (a fórmula em si vai para o Markdown), sem links externos e sem VBA
+_LARGE_WORKBOOK_BYTES = 5 * 1024 * 1024
+
+# Planilha em memória (upload) ou caminho em disco (aberto direto pelo leitor,
+# sem copiar o arquivo inteiro para bytes)
+ExcelSource = Union[bytes, str, Path]
+
+
+@lru_cache(maxsize=None)
+def _get_load_workbook():
+    """Importa openpyxl.load_workbook sob demanda."""
     from openpyxl import load_workbook
-    EXCEL_AVAILABLE = True
-except ImportError:
-    EXCEL_AVAILABLE = False
+    return load_workbook
 
 
-def convert_excel_to_markdown(file_content: bytes, filename: str) -> Optional[str]:
+@lru_cache(maxsize=None)
+def _get_calamine_workbook():
+    """Importa python_calamine.CalamineWorkbook sob demanda."""
+    from python_calamine import CalamineWorkbook
+    return CalamineWorkbook
+
+
+def convert_excel_to_markdown(file_content: ExcelSource, filename: str, pretty: bool = False) -> Optional[str]:
     """
     Converte Excel para Markdown preservando estrutura de planilhas.
-    
+
     Args:
-        file_content: Conteúdo do arquivo em bytes
+        file_content: Conteúdo do arquivo em bytes ou caminho do arquivo
         filename: Nome do arquivo (para logging)
-        
+        pretty: Se True, alinha as colunas (duas passadas por planilha, mais bytes)
+
+    Com openpyxl, arquivos acima de 5 MB trazem o texto das fórmulas em vez do
+    valor calculado (calamine sempre lê o valor calculado).
+
     Returns:
         str: Conteúdo Markdown ou None se erro
     """
     if not EXCEL_AVAILABLE:
-        logger.error("Excel não suportado - pandas/openpyxl não instalados")
+        logger.error("Excel não suportado - python-calamine/openpyxl não instalados")
         return None
-    
+
     try:
-        excel_file = io.BytesIO(file_content)
-        markdown_parts = [f"# {filename}\n\n"]
-        
-        # Carregar workbook para listar sheets
-        workbook = load_workbook(excel_file, read_only=True, data_only=True)
-        sheet_names = workbook.sheetnames
-        
-        # Converter cada sheet
-        for sheet_name in sheet_names:
-            markdown_parts.append(f"## Planilha: {sheet_name}\n\n")
-            
-            # Ler sheet com pandas
-            excel_file.seek(0)  # Resetar posição
-            df = pd.read_excel(excel_file, sheet_name=sheet_name, engine='openpyxl')
-            
-            if df.empty:
-                markdown_parts.append("*Planilha vazia*\n\n")
+        buf = io.StringIO()
+        buf.write(f"# {filename}\n\n")
+
+        if CALAMINE_AVAILABLE:
+            sheets = _iter_sheets_calamine(file_content)
+        else:
+            sheets = _iter_sheets_openpyxl(file_content)
+
+        for sheet_name, rows in sheets:
+            buf.write(f"## Planilha: {sheet_name}\n\n")
+
+            if pretty:
+                written = _write_pretty_table(buf, rows)
+            else:
+                written = _write_sheet_table(buf, rows)
+
+            if not written:
+                buf.write("*Planilha vazia*\n\n")
                 continue
-            
-            # Converter DataFrame para Markdown
-            markdown_table = df.to_markdown(index=False, tablefmt="pipe")
-            markdown_parts.append(markdown_table)
-            markdown_parts.append("\n\n")
-        
-        workbook.close()
-        return "".join(markdown_parts)
-        
+            buf.write("\n\n")
+
+        return buf.getvalue()
+
     except Exception as e:
-        logger.error(f"Erro ao converter Excel '{filename}': {e}")
-        import traceback
-        logger.error(traceback.format_exc())
+        logger.exception("Erro ao converter Excel '{}': {}", filename, e)
+        return None
+
+
+def _iter_sheets_openpyxl(file_content: ExcelSource) -> Iterator[Tuple[str, Iterable[tuple]]]:
+    """Gera (nome da planilha, linhas como tuplas) lendo o arquivo com openpyxl."""
+    if isinstance(file_content, bytes):
+        excel_file = io.BytesIO(file_content)
+        size = len(file_content)
+    else:
+        excel_file = file_content
+        size = os.path.getsize(file_content)
+    # Um único parse do arquivo: cada sheet é lida direto do workbook,
+    # sem reabrir o ZIP com pd.read_excel por planilha
+    if size > _LARGE_WORKBOOK_BYTES:
+        # Células com fórmula chegam como texto ("=SOMA(B2:B9)") e são
+        # escritas literalmente: contexto suficiente para o LLM
+        workbook = _get_load_workbook()(
+            excel_file, read_only=True, data_only=False, keep_links=False, keep_vba=False
+        )
+    else:
+        workbook = _get_load_workbook()(excel_file, read_only=True, data_only=True)
+    try:
+        for sheet_name in workbook.sheetnames:
+            yield sheet_name, workbook[sheet_name].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def _iter_sheets_calamine(file_content: ExcelSource) -> Iterator[Tuple[str, Iterable[tuple]]]:
+    """
+    Gera (nome da planilha, linhas como tuplas) lendo o arquivo com python-calamine.
+
+    As linhas são normalizadas para o formato do openpyxl (célula vazia = None,
+    número inteiro sem ".0", data como datetime), para que o Markdown não
+    dependa do leitor.
+    """
+    if isinstance(file_content, bytes):
+        workbook = _get_calamine_workbook().from_filelike(io.BytesIO(file_content))
+    else:
+        workbook = _get_calamine_workbook().from_path(str(file_content))
+    for sheet_name in workbook.sheet_names:
+        sheet = workbook.get_sheet_by_name(sheet_name)
+        yield sheet_name, map(_normalize_calamine_row, sheet.iter_rows())
+
+
+def _normalize_calamine_cell(cell):
+    """Converte uma célula do calamine para o valor que o openpyxl produziria."""
+    if cell == "":
         return None
+    if isinstance(cell, float):
+        return int(cell) if cell.is_integer() else cell
+    # openpyxl lê toda célula com formato de data como datetime ("2024-01-05 00:00:00");
+    # calamine devolve date quando não há hora
+    if isinstance(cell, date) and not isinstance(cell, datetime):
+        return datetime.combine(cell, time())
+    return cell
+
+
+def _normalize_calamine_row(row: list) -> tuple:
+    """Célula vazia ("") vira None; float inteiro vira int; date vira datetime (como no openpyxl)."""
+    return tuple(map(_normalize_calamine_cell, row))
+
+
+def _trim_row(row: tuple) -> tuple:
+    """Remove células vazias do fim da linha (vazia se a linha inteira é None)."""
+    end = len(row)
+    while end and row[end - 1] is None:
+        end -= 1
+    return row[:end]
+
+
+def _write_sheet_table(buf: io.StringIO, rows) -> bool:
+    """
+    Escreve a planilha como tabela Markdown em uma passada sobre as linhas.
+
+    Linhas totalmente vazias são ignoradas; a primeira linha com conteúdo é o
+    cabeçalho e as demais são completadas até a largura dele.
+
+    Returns:
+        bool: False se a planilha não tem linhas de dados (só cabeçalho ou vazia)
+    """
+    header = None
+    has_data = False
+    for row in rows:
+        row = _trim_row(row)
+        if not row:
+            continue
+        if header is None:
+            header = row
+            continue
+        if not has_data:
+            buf.write("| " + " | ".join(["" if cell is None else str(cell) for cell in header]) + " |\n")
+            buf.write("|" + "---|" * len(header))
+            has_data = True
+        # Célula convertida inline (sem chamada de função por célula)
+        cells = ["" if cell is None else str(cell) for cell in row]
+        if len(cells) < len(header):
+            cells.extend([""] * (len(header) - len(cells)))
+        buf.write("\n| " + " | ".join(cells) + " |")
+    return has_data
+
+
+def _write_pretty_table(buf: io.StringIO, rows) -> bool:
+    """
+    Escreve a planilha com colunas alinhadas (números à direita, texto à esquerda).
+
+    Mesmas regras de linhas vazias/cabeçalho de _write_sheet_table, mas precisa
+    materializar a planilha para medir as colunas.
+    """
+    data = [row for row in map(_trim_row, rows) if row]
+    if len(data) < 2:
+        return False
+
+    num_cols = max(len(row) for row in data)
+    text_rows: List[List[str]] = [
+        ["" if cell is None else str(cell) for cell in row] + [""] * (num_cols - len(row))
+        for row in data
+    ]
+    widths = [max(3, max(len(row[col]) for row in text_rows)) for col in range(num_cols)]
+
+    # Coluna numérica: todas as células de dados preenchidas são números (bool não conta)
+    numeric = [
+        all(
+            isinstance(row[col], Number) and not isinstance(row[col], bool)
+            for row in data[1:]
+            if col < len(row) and row[col] is not None
+        )
+        for col in range(num_cols)
+    ]
+
+    def line(cells: List[str]) -> str:
+        return "| " + " | ".join(
+            cell.rjust(width) if is_num else cell.ljust(width)
+            for cell, width, is_num in zip(cells, widths, numeric)
+        ) + " |"
+
+    separator = "|" + "|".join(
+        "-" * (width + 1) + ":" if is_num else ":" + "-" * (width + 1)
+        for width, is_num in zip(widths, numeric)
+    ) + "|"
+
+    buf.write(line(text_rows[0]))
+    buf.write("\n")
+    buf.write(separator)
+    for row in text_rows[1:]:
+        buf.write("\n")
+        buf.write(line(row))
+    return True
@@ -1,89 +1,362 @@
 """
 Conversor de PDF para Markdown.
 """
-from typing import Optional
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Union
+import importlib.util
 import io
+import multiprocessing
+import os
+import tempfile
+import threading
 from loguru import logger
 
-try:
+# Disponibilidade verificada sem importar: PyPDF2/pdfplumber (pdfminer) só são
+# carregados na primeira conversão de PDF
+PYPDF2_AVAILABLE = importlib.util.find_spec("PyPDF2") is not None
+PDFPLUMBER_AVAILABLE = importlib.util.find_spec("pdfplumber") is not None
+
+# Extração em paralelo por faixas de páginas (pdfminer é Python puro e segura a
+# GIL, então threads não aceleram; cada processo abre seu próprio documento)
+PDF_MAX_WORKERS = int(os.getenv("PDF_MAX_WORKERS", str(min(8, os.cpu_count() or 1))))
+_PARALLEL_MIN_PAGES = 40
+_PAGES_PER_TASK = 10
+
+# Leitores aceitam lixo antes do cabeçalho "%PDF-" dentro do primeiro KiB
+_PDF_MAGIC = b"%PDF-"
+_PDF_HEADER_WINDOW = 1024
+
+# Menor número de linhas que fecha uma célula (2 horizontais + 2 verticais):
+# abaixo disso, sem retângulos/curvas, a estratégia "lines" não acha tabela
+_MIN_TABLE_LINES = 4
+
+_page_executor: Optional[ProcessPoolExecutor] = None
+# Conversões rodam em threads (to_thread): criação/descarte do pool sob lock
+_page_executor_lock = threading.Lock()
+
+# PDF em memória (upload) ou caminho em disco (lido sob demanda pelo parser)
+PdfSource = Union[bytes, str, Path]
+
+
+@lru_cache(maxsize=None)
+def _get_pypdf2():
+    """Importa PyPDF2 sob demanda."""
     import PyPDF2
-    PYPDF2_AVAILABLE = True
-except ImportError:
-    PYPDF2_AVAILABLE = False
+    return PyPDF2
+
 
-try:
+@lru_cache(maxsize=None)
+def _get_pdfplumber():
+    """Importa pdfplumber sob demanda."""
     import pdfplumber
-    PDFPLUMBER_AVAILABLE = True
-except ImportError:
-    PDFPLUMBER_AVAILABLE = False
+    return pdfplumber
+
+
+def looks_like_pdf(file_content: PdfSource) -> bool:
+    """
+    Verifica o cabeçalho "%PDF-" no primeiro KiB, sem abrir o parser.
+    
+    Args:
+        file_content: Conteúdo em bytes ou caminho do arquivo em disco
+        
+    Returns:
+        bool: True se o conteúdo tem cabeçalho de PDF
+    """
+    if isinstance(file_content, bytes):
+        head = file_content[:_PDF_HEADER_WINDOW]
+    else:
+        try:
+            with open(file_content, "rb") as f:
+                head = f.read(_PDF_HEADER_WINDOW)
+        except OSError:
+            return False
+    return _PDF_MAGIC in head
 
 
-def convert_pdf_to_markdown(file_content: bytes, filename: str) -> Optional[str]:
+def convert_pdf_to_markdown(
+    file_content: PdfSource,
+    filename: str,
+    stream: bool = False,
+    detect_tables: bool = True
+) -> Union[str, Iterator[Tuple[int, str]], None]:
     """
     Converte PDF para Markdown usando pdfplumber (preferido) ou PyPDF2 (fallback).
     
     Args:
-        file_content: Conteúdo do arquivo em bytes
+        file_content: Conteúdo do arquivo em bytes ou caminho do arquivo em disco
+            (sem cópia do PDF inteiro para a memória)
         filename: Nome do arquivo (para logging)
+        stream: Se True, retorna o gerador de (página, fragmento Markdown) sem
+            materializar o documento inteiro (página 0 = título; erros
+            de extração propagam durante a iteração)
+        detect_tables: Se False, não procura tabelas (documentos só de texto)
         
     Returns:
-        str: Conteúdo Markdown ou None se erro
+        str: Conteúdo Markdown ou None se erro (gerador se stream=True)
     """
     if not PYPDF2_AVAILABLE:
         logger.error("PDF não suportado - PyPDF2 não instalado")
         return None
     
+    # Arquivo corrompido/renomeado: rejeitado antes de carregar o parser
+    if not looks_like_pdf(file_content):
+        logger.error(f"Arquivo '{filename}' não é um PDF válido (cabeçalho %PDF- ausente)")
+        return None
+    
+    # Tentar pdfplumber primeiro (melhor qualidade para tabelas)
+    if PDFPLUMBER_AVAILABLE:
+        pages = _iter_pages_pdfplumber(file_content, filename, detect_tables)
+    else:
+        # Fallback para PyPDF2
+        pages = _iter_pages_pypdf2(file_content, filename)
+    
+    if stream:
+        return ((page_num, fragment) for page_num, fragment, _ in pages)
+    
     try:
-        # Tentar pdfplumber primeiro (melhor qualidade para tabelas)
-        if PDFPLUMBER_AVAILABLE:
-            return _convert_with_pdfplumber(file_content, filename)
-        else:
-            # Fallback para PyPDF2
-            return _convert_with_pypdf2(file_content, filename)
+        buf = io.StringIO()
+        text_length = 0
+        for _, fragment, page_text_length in pages:
+            buf.write(fragment)
+            text_length += page_text_length
+        
+        # Só cabeçalhos de página: PDF escaneado/sem texto nativo (None deixa o
+        # chamador tentar OCR em vez de indexar um documento vazio)
+        if not text_length:
+            logger.warning(f"PDF '{filename}' sem texto extraível (possivelmente escaneado)")
+            return None
+        return buf.getvalue()
     except Exception as e:
-        logger.error(f"Erro ao converter PDF '{filename}': {e}")
-        import traceback
-        logger.error(traceback.format_exc())
+        logger.exception("Erro ao converter PDF '{}': {}", filename, e)
+        return None
+
+
+def _get_page_executor() -> Optional[ProcessPoolExecutor]:
+    """Pool de processos compartilhado (criado no primeiro PDF grande)."""
+    global _page_executor
+    if PDF_MAX_WORKERS <= 1:
         return None
+    with _page_executor_lock:
+        if _page_executor is None:
+            # spawn: o processo do servidor tem threads (logs, event loop), fork não é seguro
+            _page_executor = ProcessPoolExecutor(
+                max_workers=PDF_MAX_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _page_executor
+
 
+def _discard_broken_executor(error: Exception, executor: ProcessPoolExecutor) -> None:
+    """Descarta o pool quebrado para que o próximo PDF grande crie outro."""
+    global _page_executor
+    if not isinstance(error, BrokenExecutor):
+        return
+    with _page_executor_lock:
+        # Outra conversão pode já ter trocado o pool: só descarta o que quebrou
+        if _page_executor is executor:
+            _page_executor = None
 
-def _convert_with_pdfplumber(file_content: bytes, filename: str) -> str:
-    """Converte PDF usando pdfplumber (melhor para tabelas)."""
-    pdf_file = io.BytesIO(file_content)
-    markdown_parts = [f"# {filename}\n\n"]
+
+def _render_page(page, page_num: int, detect_tables: bool = True) -> Tuple[str, int]:
+    """
+    Converte uma página do pdfplumber para Markdown (texto + tabelas).
     
-    with pdfplumber.open(pdf_file) as pdf:
-        for page_num, page in enumerate(pdf.pages, start=1):
-            markdown_parts.append(f"## Página {page_num}\n\n")
-            
-            # Extrair texto
-            text = page.extract_text()
-            if text:
-                markdown_parts.append(f"{text}\n\n")
+    Returns:
+        Tuple[fragmento Markdown, tamanho do texto extraído sem espaços nas pontas]
+    """
+    parts = [f"## Página {page_num}\n\n"]
+    text_length = 0
+    
+    # Extrair texto
+    text = page.extract_text()
+    if text:
+        # Texto e separador como partes próprias: o join final é a única cópia
+        # do texto da página (f"{text}\n\n" faria uma cópia intermediária)
+        parts.append(text)
+        parts.append("\n\n")
+        text_length = len(text.strip())
+    
+    # Extrair tabelas (a detecção é a etapa mais cara da página; sem bordas
+    # desenhadas não há o que detectar e os objetos já estão em cache)
+    if detect_tables and _may_have_tables(page):
+        for table in _extract_tables(page):
+            if table:
+                parts.append(_table_to_markdown(table))
+                parts.append("\n\n")
+    
+    return "".join(parts), text_length
+
+
+def _open_source(file_content: PdfSource):
+    """Bytes viram BytesIO; caminhos são abertos pelo próprio parser."""
+    if isinstance(file_content, bytes):
+        return io.BytesIO(file_content)
+    return file_content
+
+
+def _may_have_tables(page) -> bool:
+    """Indica se a página tem bordas suficientes para formar ao menos uma célula."""
+    return bool(page.rects or page.curves) or len(page.lines) >= _MIN_TABLE_LINES
+
+
+def _extract_tables(page) -> List[List[List[Optional[str]]]]:
+    """
+    Equivalente a page.extract_tables() com uma única passada sobre os caracteres.
+    
+    Table.extract() do pdfplumber percorre todos os caracteres da página para
+    cada linha da tabela (e recalcula o ponto médio de cada um). Aqui o ponto
+    médio é calculado uma vez por página e cada tabela/linha/célula filtra só
+    o subconjunto da etapa anterior - mesma regra de pertinência (ponto médio
+    em intervalo semiaberto), mesma saída.
+    """
+    plumber = _get_pdfplumber()
+    settings = plumber.table.TableSettings.resolve(None)
+    text_settings = settings.text_settings or {}
+    
+    midpoints = [
+        ((char["x0"] + char["x1"]) / 2, (char["top"] + char["bottom"]) / 2, char)
+        for char in page.chars
+    ]
+    
+    tables = []
+    for table in page.find_tables(settings):
+        x0, top, x1, bottom = table.bbox
+        table_chars = [m for m in midpoints if x0 <= m[0] < x1 and top <= m[1] < bottom]
+        
+        rows = []
+        for row in table.rows:
+            x0, top, x1, bottom = row.bbox
+            row_chars = [m for m in table_chars if x0 <= m[0] < x1 and top <= m[1] < bottom]
             
-            # Extrair tabelas
-            tables = page.extract_tables()
-            for table in tables:
-                if table:
-                    markdown_parts.append(_table_to_markdown(table))
-                    markdown_parts.append("\n\n")
+            cells = []
+            for cell in row.cells:
+                if cell is None:
+                    cells.append(None)
+                    continue
+                x0, top, x1, bottom = cell
+                cell_chars = [m[2] for m in row_chars if x0 <= m[0] < x1 and top <= m[1] < bottom]
+                cells.append(plumber.utils.extract_text(cell_chars, **text_settings) if cell_chars else "")
+            rows.append(cells)
+        tables.append(rows)
     
-    return "".join(markdown_parts)
+    return tables
+
+
+def _render_page_range(
+    file_content: PdfSource,
+    first: int,
+    last: int,
+    detect_tables: bool = True
+) -> List[Tuple[str, int]]:
+    """Converte as páginas first..last (1-based, inclusivo) com um documento próprio."""
+    fragments = []
+    with _get_pdfplumber().open(_open_source(file_content), pages=range(first, last + 1)) as pdf:
+        for page in pdf.pages:
+            fragments.append(_render_page(page, page.page_number, detect_tables))
+            page.close()
+    return fragments
 
 
-def _convert_with_pypdf2(file_content: bytes, filename: str) -> str:
-    """Converte PDF usando PyPDF2 (fallback básico)."""
-    pdf_file = io.BytesIO(file_content)
-    pdf_reader = PyPDF2.PdfReader(pdf_file)
-    markdown_parts = [f"# {filename}\n\n"]
+def _iter_pages_pdfplumber(
+    file_content: PdfSource,
+    filename: str,
+    detect_tables: bool = True
+) -> Iterator[Tuple[int, str, int]]:
+    """Gera (página, Markdown, tamanho do texto) usando pdfplumber (melhor para tabelas)."""
+    yield 0, f"# {filename}\n\n", 0
+    
+    with _get_pdfplumber().open(_open_source(file_content)) as pdf:
+        total_pages = len(pdf.pages)
+        executor = _get_page_executor() if total_pages >= _PARALLEL_MIN_PAGES else None
+        
+        if executor is None:
+            for page_num, page in enumerate(pdf.pages, start=1):
+                fragment, text_length = _render_page(page, page_num, detect_tables)
+                # pdfplumber mantém todas as páginas em pdf.pages com layout e
+                # caracteres em cache: liberar aqui deixa só uma página em memória
+                page.close()
+                yield page_num, fragment, text_length
+            return
+    
+    # Faixas paralelas recebem um caminho, reaberto em cada processo: upload em
+    # bytes é gravado uma vez em arquivo temporário em vez de ser serializado
+    # para o worker a cada faixa
+    temp_path = None
+    if isinstance(file_content, bytes):
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as temp_file:
+            temp_file.write(file_content)
+        temp_path = file_content = temp_file.name
+    
+    try:
+        yield from _iter_parallel_ranges(executor, file_content, filename, total_pages, detect_tables)
+    finally:
+        if temp_path is not None:
+            try:
+                os.unlink(temp_path)
+            except OSError as e:
+                logger.warning(f"Não foi possível remover o temporário '{temp_path}': {e}")
+
+
+def _iter_parallel_ranges(
+    executor: ProcessPoolExecutor,
+    pdf_path: Union[str, Path],
+    filename: str,
+    total_pages: int,
+    detect_tables: bool
+) -> Iterator[Tuple[int, str, int]]:
+    """Gera as páginas convertidas em faixas no pool, na ordem do documento."""
+    # Faixas enviadas de uma vez e consumidas na ordem de submissão: a saída
+    # mantém a ordem das páginas mesmo que as faixas terminem fora de ordem
+    ranges = [
+        (first, min(first + _PAGES_PER_TASK - 1, total_pages))
+        for first in range(1, total_pages + 1, _PAGES_PER_TASK)
+    ]
+    try:
+        futures = [
+            executor.submit(_render_page_range, pdf_path, first, last, detect_tables)
+            for first, last in ranges
+        ]
+    except Exception as e:
+        # Pool indisponível (não inicia, encerrado): documento inteiro em série
+        logger.warning(f"Extração paralela indisponível para '{filename}': {e}")
+        _discard_broken_executor(e, executor)
+        futures = [None] * len(ranges)
+    
+    try:
+        for (first, last), future in zip(ranges, futures):
+            fragments = None
+            if future is not None:
+                try:
+                    fragments = future.result()
+                except Exception as e:
+                    # Processo morto, falta de memória etc.: refaz a faixa em série
+                    logger.warning(f"Extração paralela falhou nas páginas {first}-{last} de '{filename}': {e}")
+                    _discard_broken_executor(e, executor)
+            if fragments is None:
+                fragments = _render_page_range(pdf_path, first, last, detect_tables)
+            for page_num, (fragment, text_length) in enumerate(fragments, start=first):
+                yield page_num, fragment, text_length
+    finally:
+        # Gerador fechado antes do fim (stream interrompido): faixas pendentes
+        # não chegam a abrir o arquivo, que é removido em seguida
+        for future in futures:
+            if future is not None:
+                future.cancel()
+
+
+def _iter_pages_pypdf2(file_content: PdfSource, filename: str) -> Iterator[Tuple[int, str, int]]:
+    """Gera (página, Markdown, tamanho do texto) usando PyPDF2 (fallback básico)."""
+    pdf_reader = _get_pypdf2().PdfReader(_open_source(file_content))
+    yield 0, f"# {filename}\n\n", 0
     
     for page_num, page in enumerate(pdf_reader.pages, start=1):
-        markdown_parts.append(f"## Página {page_num}\n\n")
         text = page.extract_text()
         if text:
-            markdown_parts.append(f"{text}\n\n")
-    
-    return "".join(markdown_parts)
+            yield page_num, f"## Página {page_num}\n\n{text}\n\n", len(text.strip())
+        else:
+            yield page_num, f"## Página {page_num}\n\n", 0
 
 
 def _table_to_markdown(table: list) -> str:
@@ -99,19 +372,19 @@ def _table_to_markdown(table: list) -> str:
     if not table or not table[0]:
         return ""
     
-    markdown_lines = []
+    num_cols = len(table[0])
     
-    # Cabeçalho (primeira linha)
-    header = [str(cell) if cell is not None else "" for cell in table[0]]
-    markdown_lines.append("| " + " | ".join(header) + " |")
-    markdown_lines.append("| " + " | ".join(["---"] * len(header)) + " |")
+    # Uma list comprehension para todas as linhas, célula convertida inline
+    # (sem chamada de função por célula); linhas curtas são completadas até
+    # a largura do cabeçalho ([""] * negativo é vazio)
+    markdown_lines = [
+        "| " + " | ".join(
+            ["" if cell is None else str(cell) for cell in row] + [""] * (num_cols - len(row))
+        ) + " |"
+        for row in table
+    ]
     
-    # Linhas de dados
-    for row in table[1:]:
-        cells = [str(cell) if cell is not None else "" for cell in row]
-        # Garantir que tem o mesmo número de colunas do cabeçalho
-        while len(cells) < len(header):
-            cells.append("")
-        markdown_lines.append("| " + " | ".join(cells) + " |")
+    # Separador logo após o cabeçalho (primeira linha)
+    markdown_lines.insert(1, "| " + " | ".join(["---"] * num_cols) + " |")
     
     return "\n".join(markdown_lines)
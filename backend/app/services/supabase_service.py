@@ -3,7 +3,9 @@ Serviço para interagir com Supabase.
 Cliente singleton para conexão com banco de dados.
 Circuit breakers implementados para operações críticas.
 """
-from supabase import create_client, Client
+import asyncio
+from supabase import create_client, acreate_client, Client, AsyncClient
+from supabase.lib.client_options import ClientOptions, AsyncClientOptions
 from loguru import logger
 from app.config import get_settings
 from app.core.circuit_breaker import (
@@ -17,6 +19,13 @@ settings = get_settings()
 # Instância singleton do cliente Supabase
 _supabase_client: Client | None = None
 
+# Cliente assíncrono (queries aguardadas sem bloquear o event loop)
+_async_supabase_client: AsyncClient | None = None
+_async_client_lock = asyncio.Lock()
+
+# Timeout das requisições PostgREST (padrão da lib é 120s)
+_POSTGREST_TIMEOUT_SECONDS = 30
+
 
 def get_supabase_client() -> Client:
     """
@@ -36,13 +45,47 @@ def get_supabase_client() -> Client:
         
         _supabase_client = create_client(
             str(settings.supabase_url),  # Converter HttpUrl para string
-            settings.supabase_key  # Service role key para operações administrativas
+            settings.supabase_key,  # Service role key para operações administrativas
+            options=ClientOptions(postgrest_client_timeout=_POSTGREST_TIMEOUT_SECONDS)
         )
+        # Instanciar o cliente PostgREST agora: ele mantém uma única sessão httpx
+        # (pool com keep-alive) reutilizada por todas as queries do processo
+        _supabase_client.postgrest
         logger.info("✅ Cliente Supabase inicializado")
     
     return _supabase_client
 
 
+async def get_async_supabase_client() -> AsyncClient:
+    """
+    Retorna instância singleton do cliente Supabase assíncrono.
+    
+    Returns:
+        AsyncClient: Cliente Supabase configurado (usar com `await query.execute()`)
+    """
+    global _async_supabase_client
+    
+    if _async_supabase_client is None:
+        async with _async_client_lock:
+            if _async_supabase_client is None:
+                if not settings.supabase_url or not settings.supabase_key:
+                    raise ValueError(
+                        "Supabase credentials não configuradas. "
+                        "Configure SUPABASE_URL e SUPABASE_KEY no .env"
+                    )
+                
+                client = await acreate_client(
+                    str(settings.supabase_url),
+                    settings.supabase_key,
+                    options=AsyncClientOptions(postgrest_client_timeout=_POSTGREST_TIMEOUT_SECONDS)
+                )
+                client.postgrest  # sessão httpx criada uma vez (pool com keep-alive)
+                _async_supabase_client = client
+                logger.info("✅ Cliente Supabase assíncrono inicializado")
+    
+    return _async_supabase_client
+
+
 def get_supabase_anon_client() -> Client:
     """
     Retorna cliente Supabase com anon key (para operações do frontend).
@@ -0,0 +1,91 @@
+-- =============================================================================
+-- Agregação de métricas em lote (MetricsTool.execute_batch) - Execute no Supabase SQL Editor
+-- =============================================================================
+-- Retorna count/sum/avg/min/max por métrica em uma única chamada RPC.
+-- O matching de indicador e unidade replica o processamento da MetricsTool:
+--   * indicador/unidade = primeira chave não vazia do JSONB, na mesma ordem
+--   * registros sem indicador entram em todas as métricas
+--   * "PE-Recife" casa com "Recife" e vice-versa (sufixo após o hífen)
+--   * valor aceita as mesmas formas que float() no Python (sinal, ".5", "5.",
+--     expoente, "_" entre dígitos), exceto inf/nan e dígitos não ASCII
+
+drop function if exists get_metrics_agg(text[], timestamptz, timestamptz, text);
+
+create or replace function get_metrics_agg (
+  metric_names text[],
+  period_start timestamptz,
+  period_end timestamptz,
+  unit text default null
+) returns table (
+  metric_name text,
+  count bigint,
+  sum numeric,
+  avg numeric,
+  min numeric,
+  max numeric
+)
+language sql
+stable
+as $$
+  with candidates as (
+    select
+      lower(coalesce(
+        nullif(od.data->>'indicador', ''),
+        nullif(od.data->>'metric', ''),
+        nullif(od.data->>'metric_name', ''),
+        nullif(od.data->>'tipo', ''),
+        nullif(od.data->>'tipo_indicador', '')
+      )) as indicador,
+      upper(trim(coalesce(
+        nullif(od.data->>'unidade', ''),
+        nullif(od.data->>'unit', ''),
+        nullif(od.data->>'codigo_unidade', ''),
+        nullif(od.data->>'filial', ''),
+        nullif(od.data->>'codigo_filial', '')
+      ))) as unidade,
+      coalesce(nullif(od.data->>'valor', ''), nullif(od.data->>'value', '')) as valor
+    from operational_data od
+    where od.valid_from >= period_start
+      and od.valid_from <= period_end
+      and (od.valid_until is null or od.valid_until >= now())
+  ),
+  filtered as (
+    select
+      c.indicador,
+      case
+        when c.valor ~ '^\s*[+-]?(\d(_?\d)*(\.(\d(_?\d)*)?)?|\.\d(_?\d)*)([eE][+-]?\d(_?\d)*)?\s*$'
+          then replace(c.valor, '_', '')::numeric
+      end as valor
+    from candidates c
+    where unit is null
+      or (
+        c.unidade is not null
+        and (
+          c.unidade = upper(trim(unit))
+          or (
+            position('-' in trim(unit)) > 0
+            and right(c.unidade, length(regexp_replace(upper(trim(unit)), '^.*-', '')))
+                = regexp_replace(upper(trim(unit)), '^.*-', '')
+          )
+          or (
+            position('-' in c.unidade) > 0
+            and right(upper(trim(unit)), length(regexp_replace(c.unidade, '^.*-', '')))
+                = regexp_replace(c.unidade, '^.*-', '')
+          )
+        )
+      )
+  )
+  select
+    m.name as metric_name,
+    count(f.valor) as count,
+    sum(f.valor) as sum,
+    avg(f.valor) as avg,
+    min(f.valor) as min,
+    max(f.valor) as max
+  from unnest(metric_names) as m(name)
+  left join filtered f
+    on f.indicador is null
+    or replace(f.indicador, '_', ' ') like '%' || replace(lower(m.name), '_', ' ') || '%'
+    or position(f.indicador in lower(m.name)) > 0
+  group by m.name;
+$$;
@@ -0,0 +1,23 @@
+-- =============================================================================
+-- Índices para a MetricsTool (operational_data) - Execute no Supabase SQL Editor
+-- =============================================================================
+
+-- 1. Período: filtros e ordenação por valid_from
+CREATE INDEX IF NOT EXISTS idx_operational_data_valid_from
+ON operational_data (valid_from DESC);
+
+-- 2. JSONB completo (consultas por contenção: data @> '{"unidade": "PE-Recife"}')
+CREATE INDEX IF NOT EXISTS idx_operational_data_data
+ON operational_data USING gin (data jsonb_path_ops);
+
+-- 3. Trigramas para os filtros ilike em data->>'indicador' / data->>'unidade'
+-- (jsonb_path_ops não atende ilike; pg_trgm sim)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_operational_data_indicador_trgm
+ON operational_data USING gin ((data->>'indicador') gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS idx_operational_data_unidade_trgm
+ON operational_data USING gin ((data->>'unidade') gin_trgm_ops);
+
+ANALYZE operational_data;
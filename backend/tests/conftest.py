@@ -0,0 +1,15 @@
+"""
+Configuração compartilhada dos testes do backend.
+
+As configurações da aplicação (app.config.Settings) exigem SUPABASE_URL;
+valores fictícios são definidos antes de qualquer import de `app`, e os
+logs de app.main vão para um diretório temporário.
+Nenhum teste aqui acessa serviços externos.
+"""
+import os
+import tempfile
+
+os.environ.setdefault("SUPABASE_URL", "https://test.supabase.co")
+os.environ.setdefault("SUPABASE_KEY", "test-key")
+# app.main grava logs em arquivo: fora da árvore do repositório
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="treq-test-logs-"))
@@ -0,0 +1,196 @@
+"""
+Cliente Supabase em memória para os testes.
+
+Avalia os filtros do query builder (eq, gte, lt, or_ com and()/or() aninhados,
+ilike, imatch, is.null) sobre uma lista de linhas, com a mesma semântica de
+texto do PostgREST para `data->>chave`. Permite verificar que os filtros
+empurrados para o servidor não descartam linhas que o código aceitaria.
+Chamadas RPC executam funções Python registradas por nome.
+"""
+import re
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+
+def _split_top_level(text: str) -> List[str]:
+    """Divide por vírgulas fora de aspas e parênteses."""
+    parts, current, depth, quoted, escaped = [], [], 0, False, False
+    for char in text:
+        if escaped:
+            current.append(char)
+            escaped = False
+            continue
+        if char == '\\' and quoted:
+            current.append(char)
+            escaped = True
+            continue
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        elif not quoted and depth == 0 and char == ',':
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    parts.append("".join(current))
+    return parts
+
+
+def _unquote(value: str) -> str:
+    if not (value.startswith('"') and value.endswith('"')):
+        return value
+    return re.sub(r'\\(.)', r'\1', value[1:-1])
+
+
+def _column(row: Dict[str, Any], field: str) -> Optional[str]:
+    if field.startswith("data->>"):
+        value = (row.get("data") or {}).get(field[len("data->>"):])
+    else:
+        value = row.get(field)
+    return None if value is None else str(value)
+
+
+def _compare(op: str, value: Optional[str], operand: str) -> bool:
+    if op == "is":
+        return operand == "null" and value is None
+    if value is None:
+        return False
+    if op == "eq":
+        return value == operand
+    if op == "gte":
+        return value >= operand
+    if op == "lte":
+        return value <= operand
+    if op == "lt":
+        return value < operand
+    if op == "ilike":
+        pattern = re.escape(operand).replace(r'\*', '.*')
+        return re.fullmatch(pattern, value, re.IGNORECASE | re.DOTALL) is not None
+    if op == "imatch":
+        return re.search(operand, value, re.IGNORECASE) is not None
+    raise AssertionError(f"Operador não suportado pelo fake: {op}")
+
+
+def _evaluate(condition: str, row: Dict[str, Any]) -> bool:
+    for combinator, reducer in (("and(", all), ("or(", any)):
+        if condition.startswith(combinator) and condition.endswith(")"):
+            inner = condition[len(combinator):-1]
+            return reducer(_evaluate(part, row) for part in _split_top_level(inner))
+    field, op, operand = condition.split(".", 2)
+    return _compare(op, _column(row, field), _unquote(operand))
+
+
+class FakeQuery:
+    """Query builder síncrono: acumula predicados e filtra em execute()."""
+
+    def __init__(self, rows: List[Dict[str, Any]], log: List[str], apply_or: bool):
+        self._rows = rows
+        self._log = log
+        self._apply_or = apply_or
+        self._predicates: List[Callable[[Dict[str, Any]], bool]] = []
+        self._limit: Optional[int] = None
+
+    def select(self, *_args, **_kwargs) -> "FakeQuery":
+        return self
+
+    def _add(self, field: str, op: str, operand: Any) -> "FakeQuery":
+        self._predicates.append(lambda row: _compare(op, _column(row, field), str(operand)))
+        return self
+
+    def eq(self, field, operand):
+        return self._add(field, "eq", operand)
+
+    def gte(self, field, operand):
+        return self._add(field, "gte", operand)
+
+    def lte(self, field, operand):
+        return self._add(field, "lte", operand)
+
+    def lt(self, field, operand):
+        return self._add(field, "lt", operand)
+
+    def or_(self, filters: str) -> "FakeQuery":
+        self._log.append(filters)
+        if self._apply_or:
+            self._predicates.append(
+                lambda row: any(_evaluate(part, row) for part in _split_top_level(filters))
+            )
+        return self
+
+    def order(self, field: str, desc: bool = False) -> "FakeQuery":
+        self._rows = sorted(self._rows, key=lambda row: row.get(field) or "", reverse=desc)
+        return self
+
+    def limit(self, count: int) -> "FakeQuery":
+        self._limit = count
+        return self
+
+    def _result(self) -> SimpleNamespace:
+        data = [row for row in self._rows if all(pred(row) for pred in self._predicates)]
+        return SimpleNamespace(data=data[:self._limit] if self._limit is not None else data)
+
+    def execute(self) -> SimpleNamespace:
+        return self._result()
+
+
+class AsyncFakeQuery(FakeQuery):
+    """Mesmo builder, com execute() aguardável (cliente assíncrono)."""
+
+    async def execute(self) -> SimpleNamespace:
+        return self._result()
+
+
+class FakeRpc:
+    """Chamada RPC: execute() roda a função registrada (exceções se propagam)."""
+
+    def __init__(self, function: Callable[[Dict[str, Any]], List[Dict[str, Any]]], params: Dict[str, Any]):
+        self._function = function
+        self._params = params
+
+    def execute(self) -> SimpleNamespace:
+        return SimpleNamespace(data=self._function(self._params))
+
+
+class AsyncFakeRpc(FakeRpc):
+    """Mesma chamada, com execute() aguardável (cliente assíncrono)."""
+
+    async def execute(self) -> SimpleNamespace:
+        return SimpleNamespace(data=self._function(self._params))
+
+
+class FakeSupabase:
+    """
+    Cliente com uma tabela em memória.
+
+    Args:
+        rows: Linhas retornadas por qualquer tabela
+        apply_or: False ignora os filtros or_ (simula a ausência de pushdown)
+        asynchronous: True devolve builders com execute() assíncrono
+        functions: Funções RPC por nome, chamadas com os parâmetros da chamada
+    """
+
+    def __init__(
+        self,
+        rows: List[Dict[str, Any]],
+        apply_or: bool = True,
+        asynchronous: bool = False,
+        functions: Optional[Dict[str, Callable[[Dict[str, Any]], List[Dict[str, Any]]]]] = None
+    ):
+        self.rows = rows
+        self.apply_or = apply_or
+        self.asynchronous = asynchronous
+        self.functions = functions or {}
+        self.or_filters: List[str] = []
+        self.rpc_calls: List[tuple] = []
+
+    def table(self, _name: str) -> FakeQuery:
+        query_class = AsyncFakeQuery if self.asynchronous else FakeQuery
+        return query_class(list(self.rows), self.or_filters, self.apply_or)
+
+    def rpc(self, name: str, params: Dict[str, Any]) -> FakeRpc:
+        self.rpc_calls.append((name, params))
+        rpc_class = AsyncFakeRpc if self.asynchronous else FakeRpc
+        return rpc_class(self.functions[name], params)
@@ -0,0 +1,52 @@
+"""
+Gera PDFs mínimos (sem dependências) para os testes do conversor.
+
+Cada página tem uma linha de texto e uma tabela 3x3 desenhada com linhas,
+suficiente para a estratégia "lines" do pdfplumber encontrar a tabela.
+"""
+from typing import List
+
+
+def _page_stream(page_num: int) -> bytes:
+    ops: List[str] = [f"BT /F1 12 Tf 72 760 Td (Relatorio pagina {page_num}) Tj ET"]
+    # Grade 3x3: x de 72 a 372, y de 500 a 620
+    for x in (72, 172, 272, 372):
+        ops.append(f"{x} 500 m {x} 620 l S")
+    for y in (500, 540, 580, 620):
+        ops.append(f"72 {y} m 372 {y} l S")
+    cells = [["Unidade", "Pedidos", "Ticket"], ["Recife", str(page_num), "10,5"], ["Salvador", "7", ""]]
+    for row_index, row in enumerate(cells):
+        y = 600 - row_index * 40
+        for col_index, text in enumerate(row):
+            if text:
+                ops.append(f"BT /F1 10 Tf {80 + col_index * 100} {y} Td ({text}) Tj ET")
+    return "\n".join(ops).encode("latin-1")
+
+
+def build_pdf(num_pages: int) -> bytes:
+    """Monta um PDF com `num_pages` páginas de texto + tabela."""
+    objects: List[bytes] = []
+    page_ids = [4 + 2 * i for i in range(num_pages)]
+    objects.append(b"<< /Type /Catalog /Pages 2 0 R >>")
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {num_pages} >>".encode())
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for i in range(num_pages):
+        stream = _page_stream(i + 1)
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_ids[i] + 1} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_at)
+    return bytes(out)
@@ -0,0 +1,59 @@
+"""
+Testes do conversor de Excel: calamine e openpyxl devem gerar o mesmo Markdown.
+"""
+import datetime as dt
+import io
+
+import pytest
+
+openpyxl = pytest.importorskip("openpyxl")
+pytest.importorskip("python_calamine")
+
+from app.services import excel_converter
+from app.services.excel_converter import convert_excel_to_markdown
+
+
+@pytest.fixture(scope="module")
+def workbook_bytes() -> bytes:
+    workbook = openpyxl.Workbook()
+    sheet = workbook.active
+    sheet.title = "Vendas"
+    sheet.append(["Data", "Hora", "Valor", "Qtd", "Ativo", "Unidade", "Duração", "Registro"])
+    sheet.append([dt.date(2024, 1, 5), dt.time(8, 30), 10.5, 3, True, "PE-Recife",
+                  dt.timedelta(hours=30), dt.datetime(2024, 1, 5, 14, 3, 2)])
+    sheet.append([dt.datetime(2024, 2, 1), None, 2.0, None, False, "", None,
+                  dt.datetime(2024, 1, 5, 0, 0, 0, 500000)])
+    sheet.append([None] * 8)
+    sheet.append([dt.date(2024, 3, 9), None, -1.25, 7])
+    workbook.create_sheet("Vazia")
+    only_header = workbook.create_sheet("Só cabeçalho")
+    only_header.append(["a", "b"])
+
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def _convert(monkeypatch, content, use_calamine, pretty):
+    with monkeypatch.context() as patch:
+        patch.setattr(excel_converter, "CALAMINE_AVAILABLE", use_calamine)
+        return convert_excel_to_markdown(content, "vendas.xlsx", pretty=pretty)
+
+
+@pytest.mark.parametrize("pretty", [False, True])
+def test_calamine_and_openpyxl_produce_same_markdown(monkeypatch, workbook_bytes, pretty):
+    via_openpyxl = _convert(monkeypatch, workbook_bytes, use_calamine=False, pretty=pretty)
+    via_calamine = _convert(monkeypatch, workbook_bytes, use_calamine=True, pretty=pretty)
+
+    assert via_openpyxl is not None
+    assert via_calamine == via_openpyxl
+    assert "2024-01-05 00:00:00" in via_calamine
+
+
+def test_reads_from_path(monkeypatch, tmp_path, workbook_bytes):
+    path = tmp_path / "vendas.xlsx"
+    path.write_bytes(workbook_bytes)
+
+    for use_calamine in (True, False):
+        assert _convert(monkeypatch, path, use_calamine, pretty=False) == \
+            _convert(monkeypatch, workbook_bytes, use_calamine, pretty=False)
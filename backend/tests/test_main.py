@@ -0,0 +1,81 @@
+"""
+Testes da aplicação FastAPI (app.main): classe de resposta padrão e escrita de logs.
+"""
+import sys
+import time
+
+import pytest
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+
+from app import main
+
+
+requires_orjson = pytest.mark.skipif(not main.ORJSON_AVAILABLE, reason="orjson não instalado")
+
+
+@requires_orjson
+def test_every_route_resolves_to_orjson_response():
+    routes = [route for route in main.app.routes if isinstance(route, APIRoute)]
+
+    assert routes
+    assert {route.path: route.response_class for route in routes} == {
+        route.path: main.ORJSONResponse for route in routes
+    }
+
+
+@requires_orjson
+@pytest.mark.parametrize("path", ["/health", "/", "/routes"])
+def test_json_endpoints_render_with_orjson(monkeypatch, path):
+    rendered = []
+    original_render = main.ORJSONResponse.render
+
+    def spy_render(self, content):
+        rendered.append(content)
+        return original_render(self, content)
+
+    monkeypatch.setattr(main.ORJSONResponse, "render", spy_render)
+
+    response = TestClient(main.app).get(path)
+
+    assert response.status_code == 200
+    assert len(rendered) == 1
+    assert response.json() == rendered[0]
+
+
+class _BrokenStream:
+    def write(self, text):
+        raise BrokenPipeError("pipe fechado")
+
+    def flush(self):
+        raise BrokenPipeError("pipe fechado")
+
+
+def _wait_for_log(marker: str, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if main.log_file.exists() and marker in main.log_file.read_text(encoding="utf-8"):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_log_writer_survives_stdout_failure(monkeypatch):
+    monkeypatch.setattr(main, "_log_write_failures", set())
+    monkeypatch.setattr(sys, "stdout", _BrokenStream())
+    main.logger.warning("registro com stdout quebrado {}", "A")
+    assert _wait_for_log("registro com stdout quebrado A")
+
+    monkeypatch.undo()
+    main.logger.warning("registro após a falha {}", "B")
+
+    assert _wait_for_log("registro após a falha B")
+    assert main._log_writer_thread.is_alive()
+
+
+def test_dropped_records_are_reported(monkeypatch):
+    monkeypatch.setattr(main, "_log_dropped", main._log_dropped + 5)
+    monkeypatch.setattr(main, "_LOG_DROP_REPORT_INTERVAL_SECONDS", 0.0)
+    main.logger.info("acordar o escritor")
+
+    assert _wait_for_log("registros de log descartados")
@@ -0,0 +1,252 @@
+"""
+Testes da MetricsTool com um Supabase em memória.
+
+O filtro empurrado para o servidor deve ser um superconjunto do matching de
+unidade/indicador feito em Python: rodar com e sem ele dá o mesmo resultado.
+"""
+import asyncio
+import gc
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from app.core.tools import metrics_tool
+from app.core.tools.base import ToolResult
+from app.core.tools.metrics_tool import MetricsTool
+from app.core.tools.metrics_utils import extract_numeric_values
+from tests.fake_supabase import FakeSupabase
+
+
+def _row(indicador, valor=10.0, unidade=None, **extra):
+    data = {"indicador": indicador, "valor": valor, **extra}
+    if unidade is not None:
+        data["unidade"] = unidade
+    return {"data": data, "valid_from": datetime.utcnow().isoformat(), "valid_until": None}
+
+
+def _make_tool(monkeypatch, rows, apply_or=True):
+    client = FakeSupabase(rows, apply_or=apply_or, asynchronous=True)
+
+    async def get_client():
+        return client
+
+    monkeypatch.setattr(metrics_tool, "get_async_supabase_client", get_client)
+    monkeypatch.setattr(metrics_tool, "get_supabase_client", lambda: FakeSupabase(rows))
+    return MetricsTool(), client
+
+
+@pytest.mark.parametrize("stored, requested", [
+    ("pedidos_cancelados", "pedidos cancelados"),  # '_' no registro, espaço na busca
+    ("pedidos", "pedidos_cancelados"),             # indicador contido no nome buscado
+    ("", "pedidos_cancelados"),                    # indicador vazio conta como ausente
+])
+async def test_metric_rows_accepted_by_python_match_reach_it(monkeypatch, stored, requested):
+    tool, client = _make_tool(monkeypatch, [_row(stored, 5.0), _row(stored, 7.0)])
+
+    result = await tool._fetch_metric(requested, "today", None)
+
+    assert result.success, result.message
+    assert result.data["count"] == 2
+    # O indicador não é filtrado no servidor
+    assert not any("indicador" in filters for filters in client.or_filters)
+
+
+UNIT_ROWS = [
+    _row("pedidos", 1.0, unidade="PE-Recife"),
+    _row("pedidos", 2.0, unidade="Recife"),
+    _row("pedidos", 3.0, unidade="pe-recife "),
+    _row("pedidos", 4.0, unidade="XX-Cife"),
+    _row("pedidos", 5.0, unidade="BA-Salvador"),
+    _row("pedidos", 6.0, unidade="PE-"),
+    _row("pedidos", 7.0, unidade=""),
+    _row("pedidos", 8.0),
+    _row("pedidos", 9.0, unidade="Recife (PE)"),
+    _row("pedidos", 10.0, unidade="Salvador", filial="PE-Recife"),
+]
+
+
+@pytest.mark.parametrize("unit", ["PE-Recife", "Recife", "PE", "recife", "BA-Salvador", "PE - Recife", "X.*"])
+async def test_unit_pushdown_keeps_every_python_match(monkeypatch, unit):
+    tool, _ = _make_tool(monkeypatch, UNIT_ROWS, apply_or=False)
+    expected = await tool._fetch_metric("pedidos", "today", unit)
+
+    tool, client = _make_tool(monkeypatch, UNIT_ROWS, apply_or=True)
+    result = await tool._fetch_metric("pedidos", "today", unit)
+
+    assert client.or_filters, "filtro de unidade deveria ir para o servidor"
+    assert result.success == expected.success
+    assert result.data == expected.data
+
+
+def _aged(row, days):
+    row["valid_from"] = (datetime.utcnow() - timedelta(days=days)).isoformat()
+    return row
+
+
+async def test_fallback_window_is_not_truncated_by_other_indicators(monkeypatch):
+    # Indicador frequente enche as linhas recentes; o buscado é raro e mais antigo
+    rows = [_aged(_row("entregas_atrasadas", float(i)), 2) for i in range(250)]
+    rows += [_aged(_row("pedidos_cancelados", 3.0), 10), _aged(_row("pedidos_cancelados", 5.0), 10)]
+    tool, _ = _make_tool(monkeypatch, rows)
+
+    result = await tool._fetch_metric("pedidos_cancelados", "today", None)
+
+    assert result.success, result.message
+    assert result.data["count"] == 2
+
+
+async def test_fallback_uses_any_record_tier_when_windows_are_empty(monkeypatch):
+    rows = [_aged(_row("pedidos_cancelados", 4.0), 200)]
+    tool, _ = _make_tool(monkeypatch, rows)
+
+    result = await tool._fetch_metric("pedidos_cancelados", "today", None)
+
+    assert result.success, result.message
+    assert result.data["count"] == 1
+
+
+async def test_execute_is_single_flight_while_callers_wait(monkeypatch):
+    tool, _ = _make_tool(monkeypatch, [])
+    active = 0
+    max_active = 0
+    calls = 0
+
+    async def slow_fetch(metric_name, period, unit):
+        nonlocal active, max_active, calls
+        calls += 1
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+        # Falha não é cacheada: quem aguardava consulta de novo, um de cada vez
+        return ToolResult(success=False, error="indisponível")
+
+    monkeypatch.setattr(tool, "_fetch_metric", slow_fetch)
+    key = ("pedidos", "today", "PE-Recife")
+
+    async def late_caller():
+        # Chega depois da primeira consulta terminar, com outra ainda aguardando o lock
+        await asyncio.sleep(0.03)
+        return await tool.execute(*key)
+
+    await asyncio.gather(tool.execute(*key), tool.execute(*key), late_caller())
+
+    assert calls == 3
+    assert max_active == 1
+    assert key not in metrics_tool._metrics_locks
+
+
+async def test_unused_history_prefetch_is_settled_on_early_return(monkeypatch):
+    tool, _ = _make_tool(monkeypatch, [])
+    finished = threading.Event()
+
+    def failing_history(period, unit, supabase):
+        time.sleep(0.05)
+        finished.set()
+        raise RuntimeError("histórico indisponível")
+
+    monkeypatch.setattr(metrics_tool, "fetch_ticket_medio_history", failing_history)
+    loop = asyncio.get_running_loop()
+    unhandled = []
+    loop.set_exception_handler(lambda _loop, context: unhandled.append(context))
+
+    # Sem registros: retorno antecipado antes de o histórico ser usado
+    result = await tool._fetch_metric("ticket_medio", "today", None)
+    gc.collect()
+
+    assert not result.success
+    assert finished.is_set()
+    assert unhandled == []
+
+
+def _make_batch_tool(monkeypatch, get_metrics_agg):
+    client = FakeSupabase([], asynchronous=True, functions={"get_metrics_agg": get_metrics_agg})
+
+    async def get_client():
+        return client
+
+    monkeypatch.setattr(metrics_tool, "get_async_supabase_client", get_client)
+    monkeypatch.setattr(metrics_tool, "get_supabase_client", lambda: FakeSupabase([]))
+    return MetricsTool(), client
+
+
+def _agg_rows(params):
+    # Média = posição na lista; "vazio" não tem registros no período
+    return [
+        {"metric_name": name, "count": 0 if name == "vazio" else 2,
+         "sum": 2.0 * index, "avg": float(index), "min": 0.0, "max": 2.0 * index}
+        for index, name in enumerate(params["metric_names"])
+    ]
+
+
+async def test_execute_batch_groups_by_period_and_unit_and_keeps_order(monkeypatch):
+    tool, client = _make_batch_tool(monkeypatch, _agg_rows)
+    specs = [
+        {"metric_name": "a"},
+        {"metric_name": "b", "unit": "PE-Recife"},
+        {"metric_name": "c", "period": "today"},
+        {"metric_name": "d", "period": "this_week"},
+        {"metric_name": "vazio"},
+    ]
+
+    results = await tool.execute_batch(specs)
+
+    groups = sorted((params["metric_names"], params["unit"]) for _, params in client.rpc_calls)
+    assert groups == [(["a", "c", "vazio"], None), (["b"], "PE-Recife"), (["d"], None)]
+    assert [result.data["metric_name"] for result in results[:4]] == ["a", "b", "c", "d"]
+    assert [result.data["value"] for result in results[:4]] == [0.0, 0.0, 1.0, 0.0]
+    assert not results[4].success
+    assert "vazio" in results[4].message
+
+
+async def test_execute_batch_rejects_invalid_period_and_missing_name(monkeypatch):
+    tool, client = _make_batch_tool(monkeypatch, _agg_rows)
+
+    results = await tool.execute_batch([
+        {"metric_name": "a", "period": "ontem"},
+        {"period": "today"},
+        {"metric_name": "b"},
+    ])
+
+    assert "Período inválido: ontem" in results[0].error
+    assert "metric_name" in results[1].error
+    assert results[2].success
+    assert [params["metric_names"] for _, params in client.rpc_calls] == [["b"]]
+
+
+async def test_execute_batch_rpc_error_fails_only_its_group(monkeypatch):
+    def get_metrics_agg(params):
+        if params["unit"] == "PE-Recife":
+            raise RuntimeError("rpc indisponível")
+        return _agg_rows(params)
+
+    tool, _ = _make_batch_tool(monkeypatch, get_metrics_agg)
+
+    results = await tool.execute_batch([
+        {"metric_name": "a", "unit": "PE-Recife"},
+        {"metric_name": "b"},
+        {"metric_name": "c", "unit": "PE-Recife"},
+    ])
+
+    assert [result.success for result in results] == [False, True, False]
+    assert results[0].error == results[2].error == "rpc indisponível"
+
+
+def _sql_numeric_pattern():
+    sql = (Path(__file__).parent.parent / "sql" / "create_metrics_agg_function.sql").read_text(encoding="utf-8")
+    return re.search(r"c\.valor ~ '([^']*)'", sql).group(1)
+
+
+@pytest.mark.parametrize("valor", [
+    "5", " 5 ", "-5", "+5", "5.5", ".5", "5.", "1e3", "1E-3", "+.5e+2", "1_000", "1_000.000_1",
+    "", "abc", "1__0", "_1", "1_", "1e", ".", "e3", "1.2.3", "--5", "5,5", "0x10",
+])
+def test_sql_numeric_pattern_matches_extract_numeric_values(valor):
+    accepted_in_python = extract_numeric_values([{"valor": valor}], "m").size == 1
+    accepted_in_sql = re.search(_sql_numeric_pattern(), valor, re.ASCII) is not None
+
+    assert accepted_in_sql == accepted_in_python
@@ -0,0 +1,66 @@
+"""
+Testes das funções auxiliares de métricas.
+"""
+import decimal
+import math
+
+import numpy as np
+import pytest
+
+from app.core.tools.metrics_utils import (
+    calculate_statistics,
+    extract_numeric_values,
+    fast_median,
+)
+
+
+def _reference_extract(data, metric_name):
+    """Implementação original: float() por valor; aqui NaN também é descartado."""
+    values = []
+    for record in data:
+        value = (
+            record.get('valor') or
+            record.get('value') or
+            record.get(metric_name) or
+            record.get('ticket_medio') or
+            record.get('metric_value')
+        )
+        if value is not None:
+            try:
+                float_val = float(value)
+            except (ValueError, TypeError):
+                continue
+            if not math.isnan(float_val):
+                values.append(float_val)
+    return values
+
+
+RECORDS = [
+    {"valor": "12"}, {"valor": " 12 "}, {"value": "1e3"}, {"valor": "1_000"},
+    {"valor": "inf"}, {"valor": "-inf"}, {"valor": "nan"}, {"valor": float("nan")},
+    {"valor": True}, {"valor": decimal.Decimal("2.5")}, {"valor": "10,5"},
+    {"valor": "abc"}, {"valor": [1]}, {"valor": {"a": 1}}, {"valor": np.float32(1.5)},
+    {"valor": "0x10"}, {"valor": "  "}, {"valor": "+5"}, {"valor": "١٢"}, {"valor": b"12"},
+    {"valor": 0, "value": 7}, {"ticket_medio": 45.9}, {"pedidos": "3"}, {"metric_value": None},
+    {}, {"valor": None, "metric_value": "8"},
+]
+
+
+def test_extract_numeric_values_matches_float_conversion():
+    assert extract_numeric_values(RECORDS, "pedidos").tolist() == _reference_extract(RECORDS, "pedidos")
+
+
+def test_extract_numeric_values_empty_and_dtype():
+    assert extract_numeric_values([], "x").size == 0
+    assert extract_numeric_values([{"valor": "1.5"}], "x", dtype=np.float32).dtype == np.float32
+
+
+@pytest.mark.parametrize("values", [[5.0], [3.0, 1.0], [9.0, 2.0, 7.0, 4.0, 4.0], list(range(101))])
+def test_statistics_match_numpy(values):
+    arr = np.array(values, dtype=np.float64)
+    stats = calculate_statistics(arr)
+
+    assert fast_median(arr) == pytest.approx(np.median(arr))
+    assert stats["mean"] == pytest.approx(arr.mean())
+    assert stats["median"] == pytest.approx(np.median(arr))
+    assert stats["std_dev"] == pytest.approx(arr.std(ddof=1) if arr.size > 1 else 0.0)
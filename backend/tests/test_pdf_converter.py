@@ -0,0 +1,105 @@
+"""
+Testes do conversor de PDF (pdfplumber).
+"""
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pdfplumber = pytest.importorskip("pdfplumber")
+
+from app.services import pdf_converter
+from app.services.pdf_converter import _extract_tables, convert_pdf_to_markdown
+from tests.pdf_factory import build_pdf
+
+
+def test_extract_tables_matches_pdfplumber():
+    with pdfplumber.open(io.BytesIO(build_pdf(3))) as pdf:
+        for page in pdf.pages:
+            expected = page.extract_tables()
+            assert expected, "a página de teste deveria ter uma tabela"
+            assert _extract_tables(page) == expected
+
+
+class RecordingExecutor(ThreadPoolExecutor):
+    """Pool de threads no lugar do pool de processos, registrando o source enviado."""
+
+    def __init__(self):
+        super().__init__(max_workers=4)
+        self.sources = []
+
+    def submit(self, fn, source, *args, **kwargs):
+        self.sources.append(source)
+        return super().submit(fn, source, *args, **kwargs)
+
+
+@pytest.fixture
+def recording_executor(monkeypatch):
+    executor = RecordingExecutor()
+    monkeypatch.setattr(pdf_converter, "_get_page_executor", lambda: executor)
+    yield executor
+    executor.shutdown()
+
+
+def _serial_markdown(monkeypatch, content):
+    with monkeypatch.context() as patch:
+        patch.setattr(pdf_converter, "_get_page_executor", lambda: None)
+        return convert_pdf_to_markdown(content, "doc.pdf")
+
+
+def test_parallel_upload_ships_a_path_not_the_bytes(monkeypatch, recording_executor):
+    content = build_pdf(pdf_converter._PARALLEL_MIN_PAGES + 5)
+    expected = _serial_markdown(monkeypatch, content)
+
+    markdown = convert_pdf_to_markdown(content, "doc.pdf")
+
+    assert markdown == expected
+    sources = recording_executor.sources
+    assert len(sources) == -(-(pdf_converter._PARALLEL_MIN_PAGES + 5) // pdf_converter._PAGES_PER_TASK)
+    assert all(isinstance(source, str) for source in sources)
+    assert len(set(sources)) == 1
+    assert not os.path.exists(sources[0]), "temporário deveria ser removido"
+
+
+def test_temp_file_removed_when_stream_is_closed_early(recording_executor):
+    content = build_pdf(pdf_converter._PARALLEL_MIN_PAGES)
+
+    pages = convert_pdf_to_markdown(content, "doc.pdf", stream=True)
+    next(pages)  # título
+    next(pages)  # primeira página (faixas já submetidas)
+    pages.close()
+
+    assert recording_executor.sources
+    assert not os.path.exists(recording_executor.sources[0])
+
+
+def test_page_executor_created_once_under_concurrency(monkeypatch):
+    created = []
+
+    def slow_pool(**kwargs):
+        time.sleep(0.05)
+        created.append(kwargs)
+        return object()
+
+    monkeypatch.setattr(pdf_converter, "PDF_MAX_WORKERS", 4)
+    monkeypatch.setattr(pdf_converter, "_page_executor", None)
+    monkeypatch.setattr(pdf_converter, "ProcessPoolExecutor", slow_pool)
+
+    barrier = threading.Barrier(8)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(pdf_converter._get_page_executor())
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(created) == 1
+    assert len({id(result) for result in results}) == 1
@@ -0,0 +1,83 @@
+"""
+Testes do rate limiting por dependência (rate_limit + SlidingWindowCounter).
+"""
+from types import SimpleNamespace
+
+import pytest
+from slowapi.errors import RateLimitExceeded
+
+from app.middleware import rate_limiter
+from app.middleware.rate_limiter import SlidingWindowCounter, rate_limit
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter, "sliding_window", SlidingWindowCounter(clock=fake))
+    return fake
+
+
+def _request(host="10.0.0.1", path="/chat/"):
+    return SimpleNamespace(
+        app=SimpleNamespace(state=SimpleNamespace(limiter=object())),
+        client=SimpleNamespace(host=host),
+        url=SimpleNamespace(path=path),
+        method="POST",
+        state=SimpleNamespace(),
+    )
+
+
+async def _allowed(dependency, request) -> bool:
+    try:
+        await dependency(request)
+    except RateLimitExceeded:
+        return False
+    return True
+
+
+async def test_single_limit_window(clock):
+    dependency = rate_limit("2/minute")
+    request = _request()
+
+    assert await _allowed(dependency, request)
+    assert await _allowed(dependency, request)
+    assert not await _allowed(dependency, request)
+
+    clock.now += 61
+    assert await _allowed(dependency, request)
+
+
+async def test_multi_limit_enforces_every_window(clock):
+    dependency = rate_limit("2/second;3/minute")
+    request = _request()
+
+    assert await _allowed(dependency, request)
+    clock.now += 0.1
+    assert await _allowed(dependency, request)
+    clock.now += 0.1
+    assert not await _allowed(dependency, request)  # 2/second
+
+    clock.now += 1.5
+    assert await _allowed(dependency, request)      # 3º hit do minuto
+    clock.now += 1.5
+    # A janela de 1s está livre, mas o minuto já tem 3 hits
+    assert not await _allowed(dependency, request)
+
+    clock.now += 60
+    assert await _allowed(dependency, request)
+
+
+async def test_limits_are_per_client(clock):
+    dependency = rate_limit("1/minute")
+
+    assert await _allowed(dependency, _request(host="10.0.0.1"))
+    assert await _allowed(dependency, _request(host="10.0.0.2"))
+    assert not await _allowed(dependency, _request(host="10.0.0.1"))
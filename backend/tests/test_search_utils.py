@@ -0,0 +1,59 @@
+"""
+Testes da cascata de thresholds da busca RAG.
+
+O embedding da query só deve ser gerado no primeiro cache miss, e uma única vez.
+"""
+import pytest
+
+from app.core import search_utils
+
+
+class FakeRAGService:
+    """search_similar que responde do 'cache' para os thresholds dados."""
+
+    def __init__(self, cached_thresholds, results_by_threshold):
+        self.cached_thresholds = set(cached_thresholds)
+        self.results_by_threshold = results_by_threshold
+
+    async def search_similar(self, query, top_k, similarity_threshold, filters=None,
+                             embedding_provider=None):
+        if similarity_threshold not in self.cached_thresholds:
+            assert await embedding_provider() == [0.5, 0.5]
+        return self.results_by_threshold.get(similarity_threshold, [])
+
+
+@pytest.fixture
+def embedding_calls(monkeypatch):
+    calls = []
+
+    async def fake_generate_embedding(text):
+        calls.append(text)
+        return [0.5, 0.5]
+
+    monkeypatch.setattr(search_utils, "generate_embedding", fake_generate_embedding)
+    return calls
+
+
+DOCS = [{"similarity": 0.9}, {"similarity": 0.8}]
+
+
+async def test_cache_hit_on_first_threshold_skips_embedding(embedding_calls):
+    rag = FakeRAGService(cached_thresholds=[0.30], results_by_threshold={0.30: DOCS})
+
+    results, threshold = await search_utils._run_threshold_cascade(
+        "query", [0.30, 0.25], rag, top_k=5, min_docs=2, filters=None
+    )
+
+    assert (results, threshold) == (DOCS, 0.30)
+    assert embedding_calls == []
+
+
+async def test_embedding_generated_once_across_misses(embedding_calls):
+    rag = FakeRAGService(cached_thresholds=[], results_by_threshold={0.2: DOCS})
+
+    results, threshold = await search_utils._run_threshold_cascade(
+        "query", [0.30, 0.25], rag, top_k=5, min_docs=2, filters=None
+    )
+
+    assert (results, threshold) == (DOCS, 0.20)
+    assert embedding_calls == ["query"]
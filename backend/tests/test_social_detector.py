@@ -0,0 +1,85 @@
+"""
+Testes do detector de interações sociais.
+
+A implementação usa índice de palavras, pré-filtro literal e cache; o
+resultado deve ser o mesmo da varredura original por expressão com \\b,
+reproduzida aqui como referência.
+"""
+import re
+from typing import Optional
+
+import pytest
+
+from app.core.social_detector import (
+    _CATEGORY_ORDER,
+    _CATEGORY_RESPONSES,
+    _SOCIAL_CATEGORIES,
+    detect_social_interaction,
+)
+
+
+def _reference_detect(query: str) -> Optional[str]:
+    """Algoritmo original: categorias em ordem, cada expressão testada com \\b."""
+    query_lower = query.lower().strip()
+    if query_lower.startswith("consultoria:"):
+        return None
+
+    def has_exact(phrases):
+        return any(re.search(rf'\b{re.escape(p)}\b', query_lower) for p in phrases)
+
+    operational = has_exact(_SOCIAL_CATEGORIES["operational_context"])
+    for category in _CATEGORY_ORDER:
+        if has_exact(_SOCIAL_CATEGORIES[category]):
+            if category == "how_are_you" and operational:
+                continue
+            return _CATEGORY_RESPONSES[category][0]
+    return None
+
+
+QUERIES = [
+    "oi",
+    "Oi, tudo bem?",
+    "  OLÁ  ",
+    "bom dia equipe",
+    "qual seu nome?",
+    "quem é você",
+    "o que você pode fazer por mim",
+    "muito obrigado!",
+    "valeu demais",
+    "tchau",
+    "até logo",
+    "até amanhã",
+    "flw",
+    "como vai?",
+    "tudo bom com você",
+    "como está a unidade de Recife?",
+    "beleza, e a métrica de ontem?",
+    "tranquilo",
+    "consultoria: oi, tudo bem?",
+    "qual o ticket médio de hoje?",
+    "pedidos cancelados em PE-Recife",
+    "heyday das vendas",
+    "oi_teste",
+    "boitatá",
+    "bombom dia",
+    "oi, como está a operação?",
+    "obrigada, tchau",
+    "",
+    "x" * 300 + " oi",
+]
+
+
+@pytest.mark.parametrize("query", QUERIES)
+def test_matches_reference_implementation(query):
+    assert detect_social_interaction(query) == _reference_detect(query)
+
+
+def test_repeated_query_uses_same_answer():
+    # Segunda chamada passa pelo cache de _detect_category
+    first = detect_social_interaction("Bom dia!")
+    assert first is not None
+    assert detect_social_interaction("Bom dia!") == first
+
+
+def test_operational_how_are_you_is_not_social():
+    assert detect_social_interaction("como está a operação hoje?") is None
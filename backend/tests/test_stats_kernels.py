@@ -0,0 +1,36 @@
+"""
+Testes do kernel fundido de estatísticas (histórico + período atual).
+
+Com ou sem Numba, fused_stats deve coincidir com as reduções NumPy.
+"""
+import numpy as np
+import pytest
+
+from app.core.tools.stats_kernels import _fused_stats_numpy, fused_stats
+
+
+def _reference(values, is_hist):
+    hist = values[is_hist].astype(np.float64)
+    current = values[~is_hist].astype(np.float64)
+    hist_mean = hist.mean() if hist.size else 0.0
+    hist_std = hist.std(ddof=1) if hist.size > 1 else 0.0
+    current_mean = current.mean() if current.size else 0.0
+    return hist_mean, hist_std, current_mean
+
+
+CASES = [
+    (np.array([10.0, 12.0, 11.0, 15.0, 14.0]), np.array([True, True, True, False, False])),
+    (np.array([5.0]), np.array([True])),
+    (np.array([5.0, 6.0]), np.array([False, False])),
+    (np.array([], dtype=np.float64), np.array([], dtype=np.bool_)),
+    (np.random.default_rng(0).normal(100, 15, 1000).astype(np.float32),
+     np.random.default_rng(1).random(1000) < 0.8),
+]
+
+
+@pytest.mark.parametrize("values, is_hist", CASES)
+def test_fused_stats_matches_numpy(values, is_hist):
+    expected = _reference(values, is_hist)
+
+    assert fused_stats(values, is_hist) == pytest.approx(expected, rel=1e-6)
+    assert _fused_stats_numpy(values, is_hist) == pytest.approx(expected, rel=1e-6)
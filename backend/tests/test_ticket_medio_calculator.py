@@ -0,0 +1,37 @@
+"""
+Testes do histórico do ticket médio: o filtro enviado ao servidor não pode
+descartar registros que o filtro em Python aceitaria.
+"""
+from datetime import datetime
+
+import pytest
+
+from app.core.tools.ticket_medio_calculator import _fetch_historical_data
+from tests.fake_supabase import FakeSupabase
+
+
+def _row(day, valor, **data):
+    return {"valid_from": f"2025-{day}T10:00:00", "data": {"valor": valor, **data}}
+
+
+ROWS = [
+    _row("01-10", 40.0, indicador="ticket_medio", unidade="PE-Recife"),
+    _row("02-10", 41.0, indicador="Ticket Médio", unidade="pe-recife "),
+    _row("03-10", 42.0, indicador="ticket_medio", unidade=""),
+    _row("04-10", 43.0, indicador="ticket_medio"),
+    _row("05-10", 44.0, indicador="ticket_medio", unidade="BA-Salvador"),
+    _row("06-10", 45.0, indicador="pedidos", unidade="PE-Recife"),
+    _row("07-10", 46.0, indicador="", metric="ticket", unidade="PE-Recife"),
+    _row("08-10", 47.0, metric_name="ticket_medio", unidade="", unit="PE-Recife"),
+]
+
+
+@pytest.mark.parametrize("unit", [None, "PE-Recife", "BA-Salvador"])
+def test_history_pushdown_keeps_every_python_match(unit):
+    start, current_start = datetime(2025, 1, 1), datetime(2025, 12, 1)
+
+    expected = _fetch_historical_data(FakeSupabase(ROWS, apply_or=False), start, current_start, unit)
+    result = _fetch_historical_data(FakeSupabase(ROWS), start, current_start, unit)
+
+    assert expected
+    assert result == expected